@@ -0,0 +1,34 @@
+"""Write-then-rename saves.
+
+A file written through `atomic_open` is written to a temporary file in the
+same directory and only renamed over the real one once it is complete and
+on disk. Readers, and other instances writing the same file at the same
+time, see either the old file or a new one, never a mix of both.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_open(path, mode="w", **kwargs):
+    """Like open(path, mode) for writing, but replaces `path` only on success."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        try:
+            permissions = os.stat(path).st_mode & 0o777 # Keep the permissions of the file replaced
+        except OSError:
+            permissions = 0o644 # mkstemp makes the file private to us
+        os.chmod(temp_path, permissions)
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
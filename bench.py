@@ -0,0 +1,238 @@
+"""Benchmarks for the hot paths of Quick Math Challenge.
+
+Three groups are measured:
+    generate     generating a game's questions for every combination of
+                 2-4 operands, 1-3 digits, operations and mixed or single
+                 operators per question; division is the
+                 expensive case and the slowest ones are listed separately
+    leaderboard  the store calls behind the game's leaderboard (reading the
+                 top of a board, paging through it, ranking a new score and
+                 saving it), on boards of 10 up to 1M scores
+    ui           load_leaderboard_display, scrolling the leaderboard and
+                 display_question, including the redraw; needs a display,
+                 e.g. run under Xvfb:
+                     xvfb-run python bench.py --only ui
+
+Each result is the median time per call. Results are written as JSON, and
+--compare reports every benchmark that got slower than a saved baseline by
+more than --threshold (exit status 1 if any did).
+
+Usage:
+    python bench.py --out baseline.json
+    python bench.py --compare baseline.json --threshold 0.15
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from atomic_file import atomic_open
+from question_engine import (NUM_QUESTIONS, MIN_OPERANDS, MAX_STANDARD_DIGITS, GameSettings,
+                             generate_batch, settings_from_ops)
+from leaderboard_store import LeaderboardCache, LeaderboardStore
+
+GROUPS = ("generate", "leaderboard", "ui")
+OPERATION_MIXES = ("+-", "×÷", "+-×÷")
+BOARD_SIZES = (10, 1000, 100_000, 1_000_000)
+QUICK_BOARD_SIZES = (10, 1000, 10_000)
+
+
+def measure(fn, repeat=5, min_time=0.02):
+    """Times `fn`; returns the median and best seconds per call over `repeat` runs."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - started) / number)
+    return {"seconds": statistics.median(runs), "best": min(runs), "number": number, "repeat": repeat}
+
+
+def bench_generate(results, repeat):
+    rng = random.Random(1)
+    for operands, digits, ops, mixed in itertools.product(range(MIN_OPERANDS, 5),
+                                                          range(1, MAX_STANDARD_DIGITS + 1),
+                                                          OPERATION_MIXES, (False, True)):
+        settings = settings_from_ops(operands, digits, ops, mixed)
+        results[f"generate/{settings.label()}"] = measure(
+            lambda: generate_batch(settings, NUM_QUESTIONS, rng), repeat)
+
+
+def _fill_board(store, size, settings_labels):
+    rng = random.Random(size)
+    now = time.time()
+    chunk = 100_000
+    for start in range(0, size, chunk):
+        store.add_scores([(f"player{rng.randrange(5000)}", rng.uniform(15.0, 120.0),
+                           settings_labels[i % len(settings_labels)], now)
+                          for i in range(start, min(start + chunk, size))])
+
+
+def bench_leaderboard(results, repeat, sizes):
+    labels = [settings_from_ops(o, d, ops).label()
+              for o in (2, 3) for d in (1, 2) for ops in OPERATION_MIXES]
+    label = GameSettings(2, 2, True, False).label()
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"board{size}.db")
+            store = LeaderboardStore(path)
+            started = time.perf_counter()
+            _fill_board(store, size, labels)
+            results[f"leaderboard/fill/{size}"] = {"seconds": time.perf_counter() - started,
+                                                   "best": None, "number": 1, "repeat": 1}
+            cache = LeaderboardCache(store)
+            scores = itertools.cycle([random.Random(i).uniform(15.0, 120.0) for i in range(1000)])
+            results[f"leaderboard/load/{size}"] = measure(lambda: store.top(label, 10), repeat)
+            results[f"leaderboard/load_cached/{size}"] = measure(lambda: cache.top(label, 10), repeat)
+            offsets = itertools.cycle([random.Random(i).randrange(max(size // len(labels), 1))
+                                       for i in range(1000)])
+            results[f"leaderboard/page/{size}"] = measure(
+                lambda: store.page(label, "time", False, next(offsets), 20), repeat)
+            results[f"leaderboard/update/{size}"] = measure(lambda: store.standing(next(scores), label), repeat)
+            results[f"leaderboard/save/{size}"] = measure(
+                lambda: cache.add_score("bench", next(scores), label), repeat, min_time=0.1)
+            store.close()
+
+
+def _settle(root, game):
+    """Runs the Tk loop until the game's background tasks are done and their callbacks have run."""
+    while game.background.pending:
+        root.update()
+        time.sleep(0.001)
+
+
+def bench_ui(results, repeat):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e: # ImportError, or TclError without a display
+        print(f"Skipping ui benchmarks: {e}", file=sys.stderr)
+        return
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory) # Keep the game's leaderboard files out of the way
+        try:
+            from game_window import MathGameGUI
+            game = MathGameGUI(root)
+            game.question_pool.close()
+            _settle(root, game) # The leaderboard is opened by the worker thread
+            for size in (10, 1000, 100_000):
+                _fill_board(game.leaderboard, size - game.leaderboard.count(),
+                            [game.current_settings().label()])
+
+                def refresh_leaderboard(): # Until the rows read by the worker thread are shown
+                    game.load_leaderboard_display()
+                    _settle(root, game)
+                    root.update_idletasks()
+                results[f"ui/load_leaderboard_display/{size}"] = measure(refresh_leaderboard, repeat)
+
+                offsets = itertools.cycle([random.Random(i).randrange(size) for i in range(1000)])
+
+                def scroll_leaderboard():
+                    game.leaderboard_view.scroll_to(next(offsets))
+                    _settle(root, game)
+                    root.update_idletasks()
+                results[f"ui/scroll_leaderboard/{size}"] = measure(scroll_leaderboard, repeat)
+
+            batch = generate_batch(game.current_settings(), 1000, random.Random(1))
+            game.questions = itertools.cycle(batch)
+            game.game_settings = batch.settings
+            game.game_length = None
+            game.begin_play()
+
+            def next_question():
+                game.display_question()
+                root.update_idletasks()
+            results["ui/display_question"] = measure(next_question, repeat)
+            game.game_in_progress = False
+            game.leaderboard.close()
+        finally:
+            root.destroy()
+            os.chdir(cwd)
+
+
+def compare(results, baseline, threshold):
+    """Prints each benchmark against the baseline; returns the names that got slower."""
+    slower = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("seconds"):
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            slower.append(name)
+        print(f"{name:<40} {old['seconds'] * 1e6:>12.1f} us {result['seconds'] * 1e6:>12.1f} us "
+              f"{ratio:>6.2f}x{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark question generation, leaderboard and UI paths.")
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"comma-separated groups: {', '.join(GROUPS)}")
+    parser.add_argument("--quick", action="store_true", help=f"boards up to {QUICK_BOARD_SIZES[-1]} scores, 3 runs")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="flag benchmarks slower than the baseline by more than this fraction")
+    args = parser.parse_args(argv)
+
+    groups = [group.strip() for group in args.only.split(",") if group.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    repeat = 3 if args.quick else args.repeat
+    results = {}
+    if "generate" in groups:
+        bench_generate(results, repeat)
+        division = sorted((r["seconds"], name) for name, r in results.items() if "÷" in name)
+        print("Slowest division settings:", file=sys.stderr)
+        for seconds, name in division[-5:][::-1]:
+            print(f"  {name:<32} {seconds * 1e6:9.1f} us per game", file=sys.stderr)
+    if "leaderboard" in groups:
+        bench_leaderboard(results, repeat, QUICK_BOARD_SIZES if args.quick else BOARD_SIZES)
+    if "ui" in groups:
+        bench_ui(results, repeat)
+
+    report = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": args.quick},
+              "results": results}
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=1, ensure_ascii=False)
+        print()
+    elif args.out:
+        with atomic_open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f"{len(slower)} benchmarks slower than the baseline by more than "
+                  f"{args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+    elif not args.out:
+        for name, result in results.items():
+            print(f"{name:<40} {result['seconds'] * 1e6:>12.1f} us")
+
+
+if __name__ == "__main__":
+    main()
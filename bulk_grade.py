@@ -0,0 +1,267 @@
+"""Bulk grading of answer sheets collected outside the game.
+
+Each line of a submissions file is one student's sheet for one seeded
+question set. Sheets are graded against the set rebuilt with `seeded_batch`,
+using the game's own `grade_answer`, so a sheet is marked exactly the way
+the game would have marked it.
+
+JSONL, one object per line:
+    {"student": "Ana", "set": 42, "operands": 2, "digits": 2, "ops": "+-",
+     "questions": 10, "time": 41.5, "answers": ["57", "12", ...]}
+"questions" defaults to 10, "time" (seconds) is optional and "mixed": true
+marks mixed-operator sets.
+
+CSV, with a header row:
+    student,set,operands,digits,ops,time,answer1,answer2,...
+every column after "time" being an answer, one per question. CSV sheets are
+for 10-question sets; blank or missing answers count as wrong.
+
+The file is split into byte ranges that end on line boundaries, and the
+ranges are graded in a process pool, each worker reading its own range from
+the file. Only per-student totals come back, so memory stays bounded by the
+chunk size and the number of students, not by the size of the file. Each
+student's best time on a fully correct 10-question sheet is added to the
+leaderboard in one bulk write.
+
+Usage:
+    python bulk_grade.py submissions.jsonl
+    python bulk_grade.py sheets.csv --report grades.csv --workers 8
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+
+from atomic_file import atomic_open
+from question_engine import NUM_QUESTIONS, ANSWER_CORRECT, grade_answer, seeded_batch, settings_from_ops
+from leaderboard_store import LEADERBOARD_DB, LeaderboardStore
+
+CHUNK_BYTES = 8 << 20
+CSV_FIELDS = ["student", "set", "operands", "digits", "ops", "time"]
+
+# Per (student, settings label) totals, merged across chunks
+SHEETS, QUESTIONS, CORRECT, TIMED_SHEETS, TOTAL_TIME, BEST_TIME = range(6)
+
+
+def _new_totals():
+    return [0, 0, 0, 0, 0.0, None]
+
+
+@lru_cache(maxsize=4096)
+def _answer_key(settings, count, seed):
+    """Correct answers of a set; a class usually shares a handful of sets."""
+    return seeded_batch(settings, count, seed).answers
+
+
+def _sheets_from_jsonl(lines):
+    for line in lines:
+        if line.strip():
+            sheet = json.loads(line)
+            yield (sheet["student"], sheet["set"], sheet["operands"], sheet["digits"], sheet["ops"],
+                   bool(sheet.get("mixed")), sheet.get("questions", NUM_QUESTIONS), sheet.get("time"),
+                   sheet["answers"])
+
+
+def _sheets_from_csv(lines):
+    for row in csv.reader(lines):
+        if row:
+            student, seed, operands, digits, ops, seconds = row[:6]
+            answers = row[6:]
+            # Not len(answers): a set of fewer questions is a different set, not the first few of this one
+            yield (student, int(seed), int(operands), int(digits), ops, False, NUM_QUESTIONS,
+                   float(seconds) if seconds.strip() else None, answers)
+
+
+def _rows(reader, lines):
+    """Parses each sheet on its own so one bad line doesn't lose the chunk."""
+    for line in lines:
+        try:
+            yield from reader([line])
+        except (ValueError, KeyError, TypeError):
+            yield None
+
+
+def grade_chunk(path, start, end, file_format):
+    """Grades the sheets in bytes start..end of `path`.
+
+    Returns ({(student, label): totals}, number of unreadable sheets,
+    number of sheets graded).
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).decode("utf-8").splitlines()
+    reader = _sheets_from_jsonl if file_format == "jsonl" else _sheets_from_csv
+    totals = {}
+    bad = graded = 0
+    for sheet in _rows(reader, lines):
+        if sheet is None:
+            bad += 1
+            continue
+        student, seed, operands, digits, ops, mixed, count, seconds, answers = sheet
+        try:
+            settings = settings_from_ops(int(operands), int(digits), ops, mixed)
+            key = _answer_key(settings, int(count), int(seed))
+        except (ValueError, TypeError):
+            bad += 1
+            continue
+        if len(answers) > len(key):
+            bad += 1
+            continue
+        answers = list(answers) + [""] * (len(key) - len(answers)) # Unanswered questions are wrong
+        correct = sum(grade_answer(str(answer), expected) == ANSWER_CORRECT
+                      for answer, expected in zip(answers, key))
+        entry = totals.get((student, settings.label()))
+        if entry is None:
+            entry = totals[student, settings.label()] = _new_totals()
+        entry[SHEETS] += 1
+        entry[QUESTIONS] += len(key)
+        entry[CORRECT] += correct
+        if seconds is not None:
+            entry[TIMED_SHEETS] += 1
+            entry[TOTAL_TIME] += seconds
+            if correct == len(key) == NUM_QUESTIONS and (entry[BEST_TIME] is None or seconds < entry[BEST_TIME]):
+                entry[BEST_TIME] = seconds
+        graded += 1
+    return totals, bad, graded
+
+
+def merge_totals(into, totals):
+    for key, entry in totals.items():
+        merged = into.get(key)
+        if merged is None:
+            into[key] = entry
+            continue
+        for field in (SHEETS, QUESTIONS, CORRECT, TIMED_SHEETS, TOTAL_TIME):
+            merged[field] += entry[field]
+        if entry[BEST_TIME] is not None and (merged[BEST_TIME] is None or entry[BEST_TIME] < merged[BEST_TIME]):
+            merged[BEST_TIME] = entry[BEST_TIME]
+
+
+def chunk_ranges(path, first_byte=0, chunk_bytes=CHUNK_BYTES):
+    """Yields (start, end) byte ranges of `path` that each end after a newline."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = first_byte
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            if end < size:
+                f.seek(end)
+                end += len(f.readline()) # Finish the line the cut fell in
+            yield start, end
+            start = end
+
+
+def _detect_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _csv_body_start(path):
+    """Checks the CSV header and returns the offset of the first sheet."""
+    with open(path, "rb") as f:
+        header = f.readline()
+    fields = [field.strip().lower() for field in next(csv.reader([header.decode("utf-8")]), [])]
+    if fields[:len(CSV_FIELDS)] != CSV_FIELDS:
+        raise ValueError(f"{path}: expected a header starting with {','.join(CSV_FIELDS)}")
+    return len(header)
+
+
+def grade_file(path, file_format=None, workers=None, chunk_bytes=CHUNK_BYTES):
+    """Grades every sheet in `path`; returns (totals, unreadable sheets, graded sheets)."""
+    file_format = file_format or _detect_format(path)
+    first_byte = _csv_body_start(path) if file_format == "csv" else 0
+    ranges = chunk_ranges(path, first_byte, chunk_bytes)
+    totals = {}
+    bad = graded = 0
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for start, end in ranges:
+            chunk_totals, chunk_bad, chunk_graded = grade_chunk(path, start, end, file_format)
+            merge_totals(totals, chunk_totals)
+            bad += chunk_bad
+            graded += chunk_graded
+        return totals, bad, graded
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for start, end in ranges:
+            pending.add(pool.submit(grade_chunk, path, start, end, file_format))
+            if len(pending) < workers * 2: # Keep every worker busy, but not the whole file in flight
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk_totals, chunk_bad, chunk_graded = future.result()
+                merge_totals(totals, chunk_totals)
+                bad += chunk_bad
+                graded += chunk_graded
+        for future in pending:
+            chunk_totals, chunk_bad, chunk_graded = future.result()
+            merge_totals(totals, chunk_totals)
+            bad += chunk_bad
+            graded += chunk_graded
+    return totals, bad, graded
+
+
+def leaderboard_rows(totals, created=None):
+    """(name, score, settings, created) rows of each student's best perfect sheet."""
+    created = time.time() if created is None else created
+    return [(student[:12], entry[BEST_TIME], label, created)
+            for (student, label), entry in totals.items() if entry[BEST_TIME] is not None]
+
+
+def write_report(totals, out):
+    writer = csv.writer(out)
+    writer.writerow(["student", "settings", "sheets", "questions", "correct", "accuracy",
+                     "average_time", "best_time"])
+    for (student, label), entry in sorted(totals.items()):
+        average = entry[TOTAL_TIME] / entry[TIMED_SHEETS] if entry[TIMED_SHEETS] else None
+        writer.writerow([student, label, entry[SHEETS], entry[QUESTIONS], entry[CORRECT],
+                         f"{100.0 * entry[CORRECT] / entry[QUESTIONS]:.1f}" if entry[QUESTIONS] else "",
+                         f"{average:.2f}" if average is not None else "",
+                         f"{entry[BEST_TIME]:.2f}" if entry[BEST_TIME] is not None else ""])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade answer sheets in bulk.")
+    parser.add_argument("path", help="submissions file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="default: from the file extension")
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1 << 20))
+    parser.add_argument("--report", help="write per-student results to this CSV file ('-' for stdout)")
+    parser.add_argument("--db", default=LEADERBOARD_DB, help="leaderboard database")
+    parser.add_argument("--dry-run", action="store_true", help="don't add scores to the leaderboard")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        totals, bad, graded = grade_file(args.path, args.format, args.workers,
+                                         max(1, int(args.chunk_mb * (1 << 20))))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+
+    if args.report == "-":
+        write_report(totals, sys.stdout)
+    elif args.report:
+        with atomic_open(args.report, "w", newline="") as out:
+            write_report(totals, out)
+
+    rows = leaderboard_rows(totals)
+    if rows and not args.dry_run:
+        store = LeaderboardStore(args.db)
+        try:
+            store.add_scores(rows)
+        finally:
+            store.close()
+
+    print(f"Graded {graded} sheets from {len(totals)} student/settings pairs in {elapsed:.2f}s"
+          + (f", skipped {bad} unreadable" if bad else ""), file=sys.stderr)
+    print(f"{len(rows)} best times {'would be' if args.dry_run else 'were'} added to the leaderboard",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
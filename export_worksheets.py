@@ -0,0 +1,128 @@
+"""Exports printable worksheets and answer keys without opening the game.
+
+Worksheet N is question set #N (see `seeded_batch`), so any worksheet can be
+printed again, played in the game by entering its set number, or graded
+with bulk_grade.py.
+
+Formats:
+    txt    printable worksheets, one per page, and a separate answer key
+    csv    one row per question: set, question, text, answer
+    jsonl  one object per worksheet with its questions and answers
+
+Worksheets are generated one at a time and written through a buffered file
+as they are formatted, so memory use doesn't grow with the number of
+worksheets.
+
+Usage:
+    python export_worksheets.py worksheets.txt --count 10000 --operands 2 --digits 2 --ops +-
+    python export_worksheets.py worksheets.csv --count 10000 --first-set 5000
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from atomic_file import atomic_open
+from question_engine import (NUM_QUESTIONS, MIN_OPERANDS, MAX_OPERANDS, MIN_DIGITS, MAX_DIGITS,
+                             seeded_batch, settings_from_ops)
+
+WRITE_BUFFER = 1 << 20
+FORMATS = ("txt", "csv", "jsonl")
+
+
+def worksheets(settings, count, questions=NUM_QUESTIONS, first_set=0):
+    """Yields the question sets first_set .. first_set + count - 1, one at a time."""
+    for seed in range(first_set, first_set + count):
+        yield seeded_batch(settings, questions, seed)
+
+
+def txt_page(batch):
+    """One printable worksheet, ending with a form feed so each prints on its own page."""
+    lines = [f"Quick Math Challenge - Worksheet #{batch.seed} ({batch.settings.label()})\n",
+             "Name: ____________________   Time: ________\n\n"]
+    lines += [f"{i:>3})  {text.replace('?', '________')}\n\n"
+              for i, text in enumerate(batch.texts(), 1)]
+    lines.append("\f")
+    return "".join(lines)
+
+
+def txt_answer_key(batch):
+    answers = "  ".join(f"{i}) {answer}" for i, answer in enumerate(batch.answers, 1))
+    return f"#{batch.seed}: {answers}\n"
+
+
+def csv_lines(batch):
+    seed = batch.seed
+    return "".join(f"{seed},{i},{text},{answer}\n"
+                   for i, (text, answer) in enumerate(zip(batch.texts(), batch.answers), 1))
+
+
+def jsonl_line(batch):
+    settings = batch.settings
+    ops = ("+-" if settings.add_sub else "") + ("×÷" if settings.mul_div else "")
+    return json.dumps({"set": batch.seed, "operands": settings.operands, "digits": settings.digits,
+                       "ops": ops, "mixed": settings.mixed, "questions": batch.texts(),
+                       "answers": list(batch.answers)},
+                      ensure_ascii=False) + "\n"
+
+
+def write_stream(path, chunks):
+    """Writes text chunks to `path` through a large buffer; returns bytes written."""
+    with atomic_open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER, newline="") as f:
+        f.writelines(chunks)
+        return f.tell()
+
+
+def export(path, settings, count, questions=NUM_QUESTIONS, first_set=0, file_format=None,
+           answers_path=None):
+    """Writes `count` worksheets to `path`; txt exports also write an answer key."""
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format '{file_format}', expected one of {', '.join(FORMATS)}")
+    batches = worksheets(settings, count, questions, first_set)
+    if file_format == "csv":
+        return write_stream(path, itertools.chain(["set,question,text,answer\n"], map(csv_lines, batches)))
+    if file_format == "jsonl":
+        return write_stream(path, map(jsonl_line, batches))
+
+    answers_path = answers_path or "{}-answers{}".format(*os.path.splitext(path))
+    with atomic_open(answers_path, "w", encoding="utf-8", buffering=WRITE_BUFFER) as key:
+        def pages(): # The key is written alongside, so only one batch is alive at a time
+            for batch in batches:
+                key.write(txt_answer_key(batch))
+                yield txt_page(batch)
+        return write_stream(path, pages())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export worksheets and answer keys.")
+    parser.add_argument("path", help="output file; the format comes from its extension")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--count", type=int, default=1, help="number of worksheets")
+    parser.add_argument("--first-set", type=int, default=0, help="set number of the first worksheet")
+    parser.add_argument("--questions", type=int, default=NUM_QUESTIONS, help="questions per worksheet")
+    parser.add_argument("--operands", type=int, default=2, choices=range(MIN_OPERANDS, MAX_OPERANDS + 1))
+    parser.add_argument("--digits", type=int, default=2, choices=range(MIN_DIGITS, MAX_DIGITS + 1),
+                        metavar=f"{{{MIN_DIGITS}..{MAX_DIGITS}}}")
+    parser.add_argument("--ops", default="+-", help="'+-', '×÷' (or '*/') or both")
+    parser.add_argument("--mixed", action="store_true", help="mix the operators within each question")
+    parser.add_argument("--answers", help="answer key file for txt exports (default: <path>-answers.txt)")
+    args = parser.parse_args(argv)
+
+    settings = settings_from_ops(args.operands, args.digits, args.ops, args.mixed)
+    if not (settings.add_sub or settings.mul_div):
+        parser.error("--ops needs at least one of + - × ÷")
+    started = time.perf_counter()
+    try:
+        size = export(args.path, settings, args.count, args.questions, args.first_set,
+                      args.format, args.answers)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {args.count} worksheets ({size / 1e6:.1f} MB) in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,883 @@
+"""The Tk window of Quick Math Challenge; started by math_game.py."""
+import argparse
+import itertools
+import logging
+import random
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk # For themed widgets (nicer look)
+from tkinter import simpledialog, messagebox
+
+from question_engine import (GameSettings, question_stream, seeded_batch, new_seed, grade_answer,
+                             NUM_QUESTIONS, MIN_OPERANDS, MAX_OPERANDS, MIN_DIGITS, MAX_DIGITS,
+                             MAX_STANDARD_DIGITS, ANSWER_CORRECT, ANSWER_EMPTY, ANSWER_INVALID,
+                             SPRINT_SECONDS, MODE_CLASSIC, MODE_SPRINT, MODE_ENDLESS)
+from question_pool import QuestionPool
+from leaderboard_store import LeaderboardStore, LeaderboardCache, LEADERBOARD_DB, LEADERBOARD_JSON
+from leaderboard_view import LeaderboardView
+from telemetry import QuestionTimings, TIMINGS_FILE, append_records
+from seen_questions import SeenQuestions
+from player_stats import PlayerStats, AdaptiveQuestions, cell_of
+from session_journal import SessionJournal, JOURNAL_FILE, MAX_SEED, append_record
+from ui_tasks import BackgroundTasks, StallMonitor
+import tracing
+
+log = logging.getLogger("math_game")
+
+RACE_POLL_MS = 50 # How often network mode checks for messages from the race server
+QUESTION_CHARS = 20 # Longest question shown in the large font
+
+
+class MathGameGUI:
+    def __init__(self, master):
+        self.master = master
+        master.title("Quick Math Challenge!")
+        master.geometry("500x855") # Increased size for options menu
+        master.resizable(False, False)
+
+        # Styling
+        self.style = ttk.Style()
+        self.style.configure("TLabel", font=("Arial", 14))
+        self.style.configure("TButton", font=("Arial", 12))
+        self.style.configure("Header.TLabel", font=("Arial", 18, "bold"))
+        self.style.configure("Question.TLabel", font=("Arial", 24, "bold"))
+        self.style.configure("LongQuestion.TLabel", font=("Arial", 16, "bold")) # Big numbers mode
+        self.style.configure("Score.TLabel", font=("Arial", 12, "italic"))
+        self.style.configure("Start.TButton", font=("Arial", 16, "bold"))
+        self.style.configure("Options.TLabelframe", font=("Arial", 12))
+        self.style.configure("Options.TLabelframe.Label", font=("Arial", 12, "bold"))
+
+        # --- Game State Variables ---
+        self.questions = []
+        self.current_question_index = 0
+        self.game_length = NUM_QUESTIONS # None for games that run until time or a mistake ends them
+        self.start_time = 0 # time.perf_counter() when the game started
+        self.final_time = 0
+        self.current_correct_answer = 0
+        self.game_in_progress = False
+        self.awaiting_next_question = False # In the "Correct!" pause, when answers aren't taken
+        self.answer_pending = False # An answer was sent to the race server and its result hasn't come back
+        self.sprint_timer = None # 'after' id of the sprint clock
+        self.question_seed = None # Set number of the current game, for replays
+        self.game_settings = None # GameSettings of the questions being played
+        self.timings = QuestionTimings() # Per-question response times
+        self.journal = SessionJournal() # Every event of the current game, to verify its score later
+        self.player_name = "" # Last name entered for the leaderboard
+        self.seen = None # SeenQuestions of the player named in the options; used by the worker thread
+        self.unseen_game = False # The current game skips questions the player has seen
+        self.stats = None # PlayerStats of the player named in the options; loaded by the worker thread
+        self.adaptive_game = False # The current game picks questions from the player's slowest cells
+        self.question_cell = 0 # Stats cell of the question on screen
+        self.race_client = None # Connection to a race server in network mode
+        self.race_result = None # The server's 'finished' message for this race
+        self.leaderboard = None # LeaderboardStore, opened by the worker thread (see open_leaderboard)
+        self.leaderboard_cache = None # Boards kept in memory
+        self.question_pool = QuestionPool(NUM_QUESTIONS) # Generates upcoming games in the background
+        self.background = BackgroundTasks(master) # Saves and question generation, off the Tk thread
+        self.stall_monitor = StallMonitor(master) # Logs anything that still blocks the Tk thread
+
+        # --- Game Options Variables ---
+        self.num_operands = tk.IntVar(value=2)  # Default: 2 numbers in equation
+        self.num_digits = tk.IntVar(value=2)    # Default: 2-digit numbers
+        self.use_add_sub = tk.BooleanVar(value=True)  # Addition/Subtraction
+        self.use_mul_div = tk.BooleanVar(value=False) # Multiplication/Division
+        self.mixed_ops = tk.BooleanVar(value=False) # Several operators in one question
+        self.big_numbers = tk.BooleanVar(value=False) # Allow up to MAX_DIGITS digits
+        self.game_mode = tk.StringVar(value=MODE_CLASSIC)
+        self.set_number = tk.StringVar(value="") # Blank for a new random set
+        self.race_server = tk.StringVar(value="") # Blank to play offline
+        self.player = tk.StringVar(value="") # Blank to allow repeats across games
+        self.adaptive = tk.BooleanVar(value=False) # Pick questions by the player's answer times
+
+        # --- Main Layout Frames ---
+        self.options_frame = ttk.LabelFrame(master, text="Game Options", style="Options.TLabelframe")
+        self.options_frame.pack(fill=tk.BOTH, padx=20, pady=10)
+
+        self.game_frame = ttk.Frame(master)
+        self.game_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+
+        # --- Setup Options Frame ---
+        self.setup_options_frame()
+
+        # --- GUI Widgets for Game ---
+        self.header_label = ttk.Label(self.game_frame, text="Quick Math Challenge!", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+
+        # At least 20 characters wide; longer questions wrap instead of being cut off
+        self.question_label = ttk.Label(self.game_frame, text="", style="Question.TLabel", width=-20,
+                                        anchor="center", justify="center", wraplength=460)
+        self.question_label.pack(pady=20)
+
+        self.answer_entry = ttk.Entry(self.game_frame, font=("Arial", 18), width=10, justify="center")
+        self.answer_entry.pack(pady=10)
+        # Bind Enter key to submit answer
+        self.answer_entry.bind("<Return>", self.check_answer_event)
+        self.answer_entry.bind("<Key>", self.answer_keystroke_event) # Time to first keystroke
+
+        self.submit_button = ttk.Button(self.game_frame, text="Submit", command=self.check_answer, width=15)
+        self.submit_button.pack(pady=5)
+
+        self.status_label = ttk.Label(self.game_frame, text="", style="Score.TLabel", foreground="red")
+        self.status_label.pack(pady=5)
+
+        self.score_label = ttk.Label(self.game_frame, text="", style="Score.TLabel")
+        self.score_label.pack(pady=5)
+
+        # Only the visible rows are ever in the widget; it pages through the whole board
+        self.leaderboard_view = LeaderboardView(self.game_frame, self.background)
+        self.leaderboard_view.pack(fill=tk.X, pady=5)
+
+        # --- Combined Start / Play Again Button ---
+        # Initial state: "Start Game", command=self.start_game
+        self.start_button = ttk.Button(self.game_frame, text="Start Game", command=self.start_game, style="Start.TButton", width=15)
+        self.start_button.pack(pady=10) # Added more padding
+
+        # Removed the separate play_again_button
+
+        # --- Initial Setup ---
+        # The database is opened (and an old JSON leaderboard imported) while the window comes up
+        self.background.submit(self.open_leaderboard, on_done=self.leaderboard_opened,
+                               on_error=self.leaderboard_failed)
+        self.setup_game(show_welcome=True) # Setup the initial screen
+        
+        # --- Bind Enter key to start/restart game ---
+        self.master.bind("<Return>", self.start_game_event)
+
+    def start_game_event(self, event):
+        """Event handler for pressing Enter key to start/restart game."""
+        # Only trigger if game is not in progress and start button is enabled
+        if self.race_client is not None: # Races start when the server says so
+            return
+        if not self.game_in_progress and str(self.start_button['state']) == 'normal':
+            # Check which command is currently assigned to the start button
+            if self.start_button['text'] == "Start Game":
+                self.start_game()
+            else:  # "Play Again"
+                self.setup_game()
+
+    def setup_options_frame(self):
+        """Set up the options frame with game settings."""
+        # Game mode
+        mode_frame = ttk.Frame(self.options_frame)
+        mode_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(mode_frame, text="Mode:").pack(side=tk.LEFT, padx=5)
+        for text, mode in (("Endless", MODE_ENDLESS), (f"{SPRINT_SECONDS}s Sprint", MODE_SPRINT),
+                           (f"{NUM_QUESTIONS} Questions", MODE_CLASSIC)):
+            ttk.Radiobutton(mode_frame, text=text, value=mode,
+                            variable=self.game_mode).pack(side=tk.RIGHT, padx=5)
+
+        # Number of operands (numbers in the equation)
+        operands_frame = ttk.Frame(self.options_frame)
+        operands_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(operands_frame, text="Number of operands:").pack(side=tk.LEFT, padx=5)
+        operands_spinbox = ttk.Spinbox(operands_frame, from_=MIN_OPERANDS, to=MAX_OPERANDS, width=5,
+                                       textvariable=self.num_operands, state="readonly") # Use readonly state
+        operands_spinbox.pack(side=tk.RIGHT, padx=5)
+
+        # Number of digits
+        digits_frame = ttk.Frame(self.options_frame)
+        digits_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(digits_frame, text="Number of digits:").pack(side=tk.LEFT, padx=5)
+        digits_spinbox = ttk.Spinbox(digits_frame, from_=MIN_DIGITS, to=MAX_STANDARD_DIGITS, width=5,
+                                     textvariable=self.num_digits, state="readonly") # Use readonly state
+        digits_spinbox.pack(side=tk.RIGHT, padx=5)
+
+        # "Big numbers" mode raises the digit limit
+        cb_big_numbers = ttk.Checkbutton(digits_frame, text="Big numbers", variable=self.big_numbers)
+        cb_big_numbers.pack(side=tk.RIGHT, padx=5)
+
+        def update_digit_limit(*args):
+            max_digits = MAX_DIGITS if self.big_numbers.get() else MAX_STANDARD_DIGITS
+            digits_spinbox.config(to=max_digits)
+            if self.num_digits.get() > max_digits:
+                self.num_digits.set(max_digits)
+
+        self.big_numbers.trace_add("write", update_digit_limit)
+
+        # Operation types - checkboxes
+        operations_frame = ttk.Frame(self.options_frame)
+        operations_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(operations_frame, text="Operations:").pack(side=tk.LEFT, padx=5)
+
+        operations_checks_frame = ttk.Frame(operations_frame)
+        operations_checks_frame.pack(side=tk.RIGHT)
+
+        cb_add_sub = ttk.Checkbutton(operations_checks_frame, text="Addition & Subtraction (+ -)",
+                       variable=self.use_add_sub)
+        cb_add_sub.pack(anchor=tk.W)
+        cb_mul_div = ttk.Checkbutton(operations_checks_frame, text="Multiplication & Division (× ÷)",
+                       variable=self.use_mul_div)
+        cb_mul_div.pack(anchor=tk.W)
+        cb_mixed = ttk.Checkbutton(operations_checks_frame, text="Mixed, e.g. 12 + 3 × 4",
+                       variable=self.mixed_ops)
+        cb_mixed.pack(anchor=tk.W)
+
+        # Question set number, to replay a game or give everyone the same questions
+        set_frame = ttk.Frame(self.options_frame)
+        set_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(set_frame, text="Question set # (blank = random):").pack(side=tk.LEFT, padx=5)
+        set_entry = ttk.Entry(set_frame, textvariable=self.set_number, width=12)
+        set_entry.pack(side=tk.RIGHT, padx=5)
+
+        # Player name, to avoid questions the player has already seen
+        player_frame = ttk.Frame(self.options_frame)
+        player_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(player_frame, text="Player (no repeats, blank = off):").pack(side=tk.LEFT, padx=5)
+        player_entry = ttk.Entry(player_frame, textvariable=self.player, width=12)
+        player_entry.pack(side=tk.RIGHT, padx=5)
+
+        # Adaptive games, weighted toward what the player is slowest at
+        adaptive_frame = ttk.Frame(self.options_frame)
+        adaptive_frame.pack(fill=tk.X, pady=5)
+
+        cb_adaptive = ttk.Checkbutton(adaptive_frame, text="Adaptive: more of the player's slowest questions",
+                                      variable=self.adaptive)
+        cb_adaptive.pack(side=tk.LEFT, padx=5)
+
+        # Race server for network mode
+        race_frame = ttk.Frame(self.options_frame)
+        race_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(race_frame, text="Race server (host:port/room):").pack(side=tk.LEFT, padx=5)
+        race_entry = ttk.Entry(race_frame, textvariable=self.race_server, width=18)
+        race_entry.pack(side=tk.RIGHT, padx=5)
+
+        # Validator to ensure at least one operation type is selected
+        def validate_operations(*args): # Added *args to handle trace callback arguments
+            if not self.use_add_sub.get() and not self.use_mul_div.get():
+                # Use 'after' to show messagebox slightly later, avoiding potential issues
+                self.master.after(10, lambda: messagebox.showwarning("Invalid Selection", "At least one operation type must be selected!"))
+                # Re-enable Add/Sub if both get unchecked
+                self.use_add_sub.set(True)
+
+        # Bind the checkers to the validation function
+        self.use_add_sub.trace_add("write", validate_operations)
+        self.use_mul_div.trace_add("write", validate_operations)
+
+        # Start generating questions for new options as soon as they are picked
+        def prefetch_questions(*args):
+            self.question_pool.prefetch(self.current_settings())
+            self.load_leaderboard_display() # Each settings combination has its own board
+
+        for option in (self.num_operands, self.num_digits, self.use_add_sub, self.use_mul_div, self.mixed_ops):
+            option.trace_add("write", prefetch_questions)
+
+    def current_settings(self):
+        """Returns the currently selected options as a GameSettings tuple."""
+        return GameSettings(self.num_operands.get(), self.num_digits.get(),
+                            self.use_add_sub.get(), self.use_mul_div.get(), self.mixed_ops.get())
+
+    def chosen_set_number(self):
+        """Returns the question set number typed in the options, or None if blank."""
+        text = self.set_number.get().strip()
+        if not text:
+            return None
+        number = int(text) # Raises ValueError for us
+        if number < 0:
+            raise ValueError("Set numbers can't be negative")
+        if number > MAX_SEED:
+            raise ValueError("Set number too big")
+        return number
+
+    def generate_questions(self, on_ready):
+        """Prepares the questions for the selected options and game mode.
+
+        Classic games take a ready batch of NUM_QUESTIONS from the pool; sprint and
+        endless games get a question stream that never runs out. Either way the
+        questions come from a numbered set, which the player can enter again to
+        replay exactly the same questions.
+
+        Questions the pool doesn't have ready are generated in the background,
+        and on_ready() is called on the Tk thread once they are. Returns False
+        if the options can't be played.
+        """
+        # Default to addition if somehow no operations are selected (validator should prevent this)
+        if not self.use_add_sub.get() and not self.use_mul_div.get():
+            print("Warning: No operations selected, defaulting to '+'")
+            self.use_add_sub.set(True) # Ensure the checkbox reflects the default
+
+        try:
+            set_number = self.chosen_set_number()
+        except ValueError:
+            return False
+
+        settings = self.game_settings = self.current_settings()
+        name = self.player.get().strip()[:12]
+        if name: # Queued first, so the stats are loaded before the questions are ready
+            self.background.submit(self._stats_of, name)
+        else:
+            self.stats = None
+        # Numbered sets are played as they are, even if the player has seen them
+        self.adaptive_game = bool(name) and set_number is None and self.adaptive.get()
+        self.unseen_game = bool(name) and set_number is None and not self.adaptive_game
+        player = name if self.unseen_game else "" # Whose seen questions to skip
+        self.game_length = NUM_QUESTIONS if self.game_mode.get() == MODE_CLASSIC else None
+        if self.adaptive_game:
+            work = (self._adaptive_questions, settings, new_seed(), name)
+        elif self.game_mode.get() == MODE_CLASSIC:
+            batch = self.question_pool.get_nowait(settings) if set_number is None else None
+            if batch is not None and not player:
+                self._questions_ready((batch.seed, iter(batch)), on_ready)
+                return True
+            if set_number is not None:
+                work = (_seeded_questions, settings, set_number)
+            else:
+                work = (self._unseen_batch, settings, batch, player)
+        elif player:
+            work = (self._unseen_stream, settings, new_seed(), player)
+        else:
+            work = (_question_stream, settings, new_seed() if set_number is None else set_number)
+        self.background.submit(*work, on_done=lambda result: self._questions_ready(result, on_ready),
+                               on_error=self._questions_failed)
+        return True
+
+    def _questions_ready(self, result, on_ready):
+        self.question_seed, self.questions = result
+        on_ready()
+
+    def _seen_by(self, player):
+        """The player's SeenQuestions, loaded on first use (worker thread)."""
+        if self.seen is None or self.seen.path != SeenQuestions.for_player_path(player):
+            try:
+                self.seen = SeenQuestions.for_player(player)
+            except (OSError, ValueError) as e:
+                log.warning("Could not read the questions %s has seen: %s", player, e)
+                self.seen = SeenQuestions(SeenQuestions.for_player_path(player))
+        return self.seen
+
+    def _stats_of(self, player):
+        """The player's PlayerStats, loaded on first use (worker thread)."""
+        if self.stats is None or self.stats.path != PlayerStats.for_player_path(player):
+            try:
+                self.stats = PlayerStats.for_player(player)
+            except (OSError, ValueError) as e:
+                log.warning("Could not read the answer statistics of %s: %s", player, e)
+                self.stats = PlayerStats(PlayerStats.for_player_path(player))
+        return self.stats
+
+    def _adaptive_questions(self, settings, seed, player):
+        """Worker thread: endless questions from the cells `player` is slowest at."""
+        return seed, AdaptiveQuestions(self._stats_of(player), settings, seed)
+
+    def _unseen_batch(self, settings, batch, player):
+        """Worker thread: a classic game from the pool, without questions `player` has seen."""
+        if batch is None: # A pool miss, already counted by get_nowait() in setup_game
+            batch = self.question_pool.generate(settings)
+        seed = batch.seed # Still names the game in the journal, with the picks
+        if player:
+            batch = self._seen_by(player).fresh_batch(batch)
+        return seed, iter(batch)
+
+    def _unseen_stream(self, settings, seed, player):
+        """Worker thread: an endless stream of questions the player hasn't seen."""
+        stream = self._seen_by(player).fresh(question_stream(settings, random.Random(seed)))
+        return seed, itertools.chain([next(stream)], stream)
+
+    def _questions_failed(self, error):
+        log.error("Could not generate questions", exc_info=error)
+        messagebox.showerror("Error", "Could not generate questions. Please check options.")
+        self.setup_game() # Go back to setup state
+
+    def show_question_text(self, text):
+        """Shows `text` in the question label, in a smaller font if it's too long for the large one."""
+        style = "Question.TLabel" if len(text) <= QUESTION_CHARS else "LongQuestion.TLabel"
+        self.question_label.config(text=text, style=style)
+
+    def display_question(self):
+        """Updates the GUI to show the current question."""
+        if not self.game_in_progress: # e.g. the sprint ended during the "Correct!" delay
+            return
+        if self.game_length is None or self.current_question_index < self.game_length:
+            question = next(self.questions)
+            self.awaiting_next_question = False
+            self.show_question_text(question.text)
+            self.current_correct_answer = question.answer
+            self.status_label.config(text="") # Clear status
+            self.answer_entry.delete(0, tk.END) # Clear previous answer
+            self.answer_entry.focus_set() # Set focus to entry field
+            self.update_progress_label()
+            if self.adaptive_game:
+                self.question_cell, settings = self.questions.cell, self.questions.settings
+            else:
+                self.question_cell, settings = cell_of(question.op, self.game_settings), self.game_settings
+            self.timings.question_shown(question.op, settings)
+            self.journal.shown(self.question_cell if self.adaptive_game else None)
+        else:
+            self.end_game()
+
+    def update_progress_label(self):
+        """Shows how far along the current game is."""
+        number = self.current_question_index + 1
+        mode = self.game_mode.get()
+        if self.race_client is not None:
+            self.score_label.config(text=f"Race: question {number} of {self.game_length}")
+        elif mode == MODE_SPRINT:
+            time_left = max(0, SPRINT_SECONDS - (time.perf_counter() - self.start_time))
+            self.score_label.config(text=f"Question {number} - {time_left:.0f}s left")
+        elif mode == MODE_ENDLESS:
+            self.score_label.config(text=f"Question {number} - one mistake ends the game")
+        else:
+            self.score_label.config(text=f"Question {number} of {NUM_QUESTIONS}")
+
+    def tick_sprint_clock(self):
+        """Updates the sprint countdown once a second and ends the game at zero."""
+        self.sprint_timer = None
+        if not self.game_in_progress:
+            return
+        if time.perf_counter() - self.start_time >= SPRINT_SECONDS:
+            self.end_game()
+        else:
+            self.update_progress_label()
+            self.sprint_timer = self.master.after(1000, self.tick_sprint_clock)
+
+    def setup_game(self, show_welcome=False):
+        """
+        Sets up the game state for a new game or prepares the initial screen.
+        Resets state variables, enables options, disables game controls,
+        and sets the start button to 'Start Game'.
+        """
+        # *** Do NOT generate questions here anymore ***
+        # self.generate_questions()
+        self.current_question_index = 0
+        self.final_time = 0
+        self.game_in_progress = False
+        self.leave_race()
+        self.enable_options()
+
+        # Disable game-play widgets
+        self.answer_entry.delete(0, tk.END) # Clear potentially leftover answer
+        self.answer_entry.config(state=tk.DISABLED)
+        self.submit_button.config(state=tk.DISABLED)
+
+        # Have questions ready for the current options before 'Start Game' is pressed
+        self.question_pool.prefetch(self.current_settings())
+
+        # Configure the main action button for starting a new game
+        self.start_button.config(text="Start Game", command=self.start_game, state=tk.NORMAL)
+
+        # Clear display labels
+        self.status_label.config(text="")
+
+        if show_welcome:
+            self.show_question_text("Ready?")
+            self.score_label.config(text="Configure options and press enter to start!")
+        else:
+            # This case happens when 'Play Again' was clicked
+            self.show_question_text("Configure & Start!")
+            self.score_label.config(text="Options enabled. Click 'Start Game' when ready.")
+
+    def enable_options(self):
+        """Enables the options frame widgets after a game."""
+        for child in self.options_frame.winfo_children():
+            for widget in child.winfo_children():
+                 # Check widget type more carefully
+                widget_type = widget.winfo_class()
+                if widget_type in ('TSpinbox', 'TCheckbutton', 'TRadiobutton', 'TEntry'):
+                    try:
+                        widget.config(state=tk.NORMAL)
+                    except tk.TclError: # Handle potential errors if widget state is complex
+                         pass
+                elif isinstance(widget, ttk.Spinbox): # Fallback for Spinbox if style changes class name
+                    try:
+                         widget.config(state="readonly") # Spinboxes should be readonly
+                    except tk.TclError:
+                         pass
+
+    def start_game(self):
+        """Starts the game, generates questions based on current options, and starts timer."""
+        if self.race_server.get().strip():
+            self.join_race()
+            return
+
+        if self.adaptive.get() and not self.player.get().strip():
+            messagebox.showwarning("Adaptive Games", "Enter a player name: adaptive games pick questions "
+                                                     "by that player's answer times.")
+            return
+
+        # --- FIX 1: Generate questions *using current options* ---
+        # Check if question generation failed (e.g., invalid options somehow)
+        if not self.generate_questions(on_ready=self.begin_game):
+             messagebox.showerror("Error", "Could not generate questions. Please check options.")
+             self.setup_game() # Go back to setup state
+             return
+        if not self.game_in_progress: # Still generating; begin_game starts the game
+            self.disable_options()
+            self.start_button.config(state=tk.DISABLED)
+            self.show_question_text("Get ready...")
+
+    def begin_game(self):
+        """Starts a game once its questions are ready."""
+        if self.race_client is not None or self.game_in_progress:
+            return
+        self.disable_options()
+        self.begin_play()
+        if self.game_mode.get() == MODE_SPRINT:
+            self.sprint_timer = self.master.after(1000, self.tick_sprint_clock)
+        self.display_question() # Display the first question
+        self.answer_entry.focus_set()  # Set focus to entry field
+
+    def disable_options(self):
+        """Disables the options during gameplay."""
+        for child in self.options_frame.winfo_children():
+            for widget in child.winfo_children():
+                widget_type = widget.winfo_class()
+                if widget_type in ('TSpinbox', 'TCheckbutton', 'TRadiobutton', 'TEntry') or isinstance(widget, (ttk.Spinbox, ttk.Checkbutton)):
+                    try:
+                        widget.config(state=tk.DISABLED)
+                    except tk.TclError:
+                         pass
+
+    def begin_play(self):
+        """Enables the game controls and starts the timer."""
+        self.game_in_progress = True
+        self.awaiting_next_question = False
+        self.answer_pending = False
+        self.current_question_index = 0 # Ensure index is reset
+        self.start_button.config(state=tk.DISABLED)  # Disable start button during gameplay
+        self.answer_entry.config(state=tk.NORMAL)
+        self.submit_button.config(state=tk.NORMAL)
+        self.start_time = time.perf_counter()  # Start timer; monotonic, unlike time.time()
+        self.timings.begin_game()
+        self.journal.begin()
+
+    def join_race(self):
+        """Connects to the race server and waits there for the next race to start."""
+        from race_client import RaceClient, parse_address # Only network mode needs sockets
+        try:
+            host, port, room = parse_address(self.race_server.get().strip())
+        except ValueError:
+            messagebox.showerror("Race Server", "The race server should look like host:port/room.")
+            return
+        name = self.player_name or simpledialog.askstring("Race", "Enter your name:", parent=self.master)
+        if not name:
+            return
+        self.player_name = name[:12]
+        try:
+            self.race_client = RaceClient(host, port, self.player_name, room)
+        except OSError as e:
+            messagebox.showerror("Race Server", f"Could not connect to {host}:{port}: {e}")
+            return
+        self.stats = None # Race answers aren't added to the options' player
+        self.disable_options()
+        self.start_button.config(text="Leave Race", command=self.setup_game, state=tk.NORMAL)
+        self.show_question_text("Waiting...")
+        self.score_label.config(text=f"Joined room '{room}' as {self.player_name}")
+        self.master.after(RACE_POLL_MS, self.poll_race)
+
+    def leave_race(self):
+        """Disconnects from the race server, if connected."""
+        if self.race_client is not None:
+            self.race_client.close()
+            self.race_client = None
+            self.load_leaderboard_display() # Replace the race standings
+
+    def poll_race(self):
+        """Handles the messages the race server sent since the last poll."""
+        client = self.race_client
+        if client is None: # Left the race
+            return
+        while not client.messages.empty():
+            message = client.messages.get_nowait()
+            kind = message.get("type")
+            if kind == "waiting" and not self.game_in_progress:
+                starts_in = message.get("starts_in")
+                when = f" in {starts_in:.0f}s" if starts_in is not None else " after this race"
+                self.status_label.config(text=f"{message['players']} players - next race starts{when}",
+                                         foreground="blue")
+            elif kind == "start":
+                self.game_settings = GameSettings(*message["settings"])
+                self.questions = iter(seeded_batch(self.game_settings, message["questions"],
+                                                   message["seed"]))
+                self.question_seed = message["seed"]
+                self.unseen_game = self.adaptive_game = False
+                self.game_length = message["questions"]
+                self.race_result = None
+                self.begin_play()
+                self.start_button.config(state=tk.NORMAL) # Still lets the player leave
+                self.display_question()
+            elif kind == "result" and self.game_in_progress:
+                self.show_answer_result(message["status"])
+            elif kind == "standings":
+                self.show_race_standings(message["leaders"], f"{message['players']} racing")
+            elif kind == "finished":
+                self.race_result = message
+                if not self.game_in_progress:
+                    self.show_race_result()
+            elif kind == "race_over":
+                if self.game_in_progress: # Time ran out
+                    self.end_game()
+                self.show_race_standings(message["leaders"], "final")
+            elif kind == "closed":
+                if self.game_in_progress:
+                    self.end_game()
+                self.race_client = None
+                self.status_label.config(text="Disconnected from the race server.", foreground="red")
+                self.start_button.config(text="Play Again", command=self.setup_game, state=tk.NORMAL)
+                return
+        self.master.after(RACE_POLL_MS, self.poll_race)
+
+    def show_race_result(self):
+        """Shows the official race time and place once the server sent them."""
+        if self.race_result is None:
+            self.score_label.config(text=f"Your time: {self.final_time:.2f} seconds - waiting for the server")
+        else:
+            self.score_label.config(text=f"Place {self.race_result['place']} - "
+                                         f"{self.race_result['time']:.2f} seconds (set #{self.question_seed})")
+
+    def show_race_standings(self, leaders, title):
+        """Shows the live race standings where the leaderboard usually is."""
+        rows = []
+        for i, (name, solved, finish_time) in enumerate(leaders):
+            progress = f"{finish_time:.2f}" if finish_time is not None else f"{solved}/{self.game_length}"
+            rows.append((i + 1, name, progress))
+        self.leaderboard_view.show_rows(f"Race standings ({title})", rows)
+
+    def check_answer_event(self, event):
+        """Callback for the Enter key press."""
+        if self.game_in_progress:
+            self.check_answer()
+
+    def answer_keystroke_event(self, event):
+        """Records the first keystroke of each question."""
+        if self.game_in_progress:
+            self.timings.keystroke()
+            self.journal.keystroke()
+
+    def check_answer(self):
+        """Checks the user's answer against the correct answer."""
+        if not self.game_in_progress or self.awaiting_next_question or self.answer_pending: # e.g. Enter pressed twice
+            return
+
+        user_answer_str = self.answer_entry.get()
+        self.journal.submitted(user_answer_str)
+        if self.race_client is not None:
+            # Races are checked by the server; its result arrives in poll_race
+            self.answer_pending = True # Until then another answer would be graded against the next question
+            self.race_client.send_answer(user_answer_str)
+        else:
+            self.show_answer_result(grade_answer(user_answer_str, self.current_correct_answer))
+
+    def show_answer_result(self, result):
+        """Reacts to a checked answer (one of the ANSWER_* results)."""
+        self.answer_pending = False
+        self.journal.result(result)
+        if result == ANSWER_EMPTY: # Handle empty input
+            self.status_label.config(text="Please enter an answer.", foreground="orange")
+        elif result == ANSWER_INVALID:
+            self.status_label.config(text="Please enter a valid number.", foreground="red")
+        elif result == ANSWER_CORRECT:
+            elapsed = self.timings.question_answered() # The "Correct!" pause below isn't timed
+            if self.stats is not None and elapsed: # 0 when no question was open
+                self.stats.correct(self.question_cell, elapsed / 1e9)
+            self.current_question_index += 1
+            self.awaiting_next_question = True
+            self.status_label.config(text="Correct!", foreground="green")
+            # Use after to delay moving to next question slightly so user sees "Correct!"
+            self.master.after(400, self.display_question) # Reduced delay slightly
+        elif self.game_mode.get() == MODE_ENDLESS and self.race_client is None:
+            self.timings.wrong_answer()
+            if self.stats is not None:
+                self.stats.wrong(self.question_cell)
+            self.end_game()
+            self.status_label.config(text=f"Game over! The answer was {self.current_correct_answer}", foreground="red")
+        else:
+            self.timings.wrong_answer()
+            if self.stats is not None:
+                self.stats.wrong(self.question_cell)
+            self.status_label.config(text=f"Incorrect. Please try again", foreground="red")
+            self.answer_entry.delete(0, tk.END) # Clear wrong answer
+            # Maybe add a small delay before they can try again or move to next? Optional.
+            # For now, let them try the same question again immediately.
+
+    def end_game(self):
+        """Ends the game, calculates score, handles leaderboard, sets up for 'Play Again'."""
+        self.game_in_progress = False
+        # Scored on the time spent answering, without the pauses between questions
+        self.timings.close_question()
+        self.final_time = self.timings.game_seconds()
+        records = list(self.timings.records(self.timings.game_start))
+        self.background.submit(append_records, TIMINGS_FILE, records, on_error=lambda e: log.warning(
+            "Could not save question timings %s: %s", TIMINGS_FILE, e))
+        if self.sprint_timer is not None:
+            self.master.after_cancel(self.sprint_timer)
+            self.sprint_timer = None
+        replayable = not self.adaptive_game # Whether the set number alone replays this game
+        picks = None
+        player = self.player.get().strip()
+        if self.unseen_game:
+            seen = self.seen
+            if seen.skipped:
+                replayable = False
+                picks = seen.picks
+            self.background.submit(seen.save, on_error=lambda e: log.warning(
+                "Could not save the questions %s has seen: %s", player, e))
+        if self.stats is not None:
+            self.background.submit(self.stats.copy().save, on_error=lambda e: log.warning(
+                "Could not save the answer statistics of %s: %s", player, e))
+        mode = self.game_mode.get() if self.race_client is None else MODE_CLASSIC # Races have a fixed length
+        record = self.journal.finish(self.game_settings, mode, self.question_seed, self.game_length or 0, picks,
+                                     self.adaptive_game)
+        self.background.submit(append_record, JOURNAL_FILE, record, on_error=lambda e: log.warning(
+            "Could not save the game to %s: %s", JOURNAL_FILE, e))
+        set_text = f" (set #{self.question_seed})" if replayable else " (adaptive)" if self.adaptive_game else ""
+        self.show_question_text("Finished!")
+        if self.game_mode.get() == MODE_CLASSIC:
+            self.score_label.config(text=f"Your time: {self.final_time:.2f} seconds{set_text}")
+        else:
+            # Sprint and endless games are scored by questions per minute
+            correct = self.current_question_index
+            per_minute = correct * 60 / self.final_time if self.final_time > 0 else 0
+            self.score_label.config(text=f"{correct} correct - {per_minute:.1f} per minute{set_text}")
+        if self.unseen_game and self.seen.exhausted:
+            self.score_label.config(text=self.score_label.cget("text") + "\nFew new questions left - some repeated")
+        self.answer_entry.delete(0, tk.END)
+        self.answer_entry.config(state=tk.DISABLED)
+        self.submit_button.config(state=tk.DISABLED)
+        self.status_label.config(text="")
+
+        if self.race_client is not None:
+            # The server has the official time; stay connected for the next race
+            self.show_race_result()
+            self.start_button.config(text="Leave Race", command=self.setup_game, state=tk.NORMAL)
+            return
+
+        # --- FIX 2: Configure start_button for "Play Again" ---
+        # It should call setup_game when clicked next
+        self.start_button.config(text="Play Again", command=self.setup_game, state=tk.NORMAL)
+
+        # Ask for name and update leaderboard (it ranks classic games by time, of one settings combination)
+        if self.game_mode.get() == MODE_CLASSIC and not self.adaptive_game:
+            self.update_leaderboard()
+        else:
+            self.load_leaderboard_display() # Refresh display
+
+    def save_leaderboard(self, entry):
+        """Saves one leaderboard entry in the background; every score is kept.
+
+        The board and the player's rank are updated once the score is saved.
+        """
+        def save(): # Like every use of the cache, on the worker thread
+            before = self.leaderboard_cache.signature()
+            self.leaderboard.add_score(entry["name"], entry["score"], entry["settings"], entry.get("session"))
+            after = self.leaderboard_cache.signature()
+            positions = None # The board may already hold this score if it was re-read; the view re-reads it
+            if self.leaderboard_cache.score_saved(entry["name"], entry["score"], entry["settings"], before, after):
+                positions = {settings: self.leaderboard.position(entry["score"], settings)
+                             for settings in (None, entry["settings"])}
+            return self.leaderboard.standing(entry["score"], entry["settings"]), positions
+
+        def saved(result):
+            standing, positions = result
+            self.leaderboard_view.score_added(entry, positions) # Inserts just this row
+            rank, total, percentile = standing
+            self.status_label.config(text=f"Rank {rank} of {total} for {entry['settings']} "
+                                          f"(faster than {percentile:.0f}% of games)",
+                                     foreground="blue")
+
+        def failed(e):
+            log.error("Could not save score to %s: %s", LEADERBOARD_DB, e)
+            messagebox.showerror("Leaderboard Error", f"Could not save score: {e}")
+
+        self.background.submit(save, on_done=saved, on_error=failed)
+
+    def update_leaderboard(self):
+        """Adds the current score to the leaderboard and shows where it ranks."""
+        # Create a description of the game settings
+        settings_str = self.current_settings().label()
+
+        # Prompt for name only if the game was successfully completed (time > 0)
+        if self.final_time > 0:
+             name = simpledialog.askstring("Leaderboard Entry",
+                                           f"Your time: {self.final_time:.2f}s\nEnter your name:",
+                                           initialvalue=self.player_name or self.player.get().strip(),
+                                           parent=self.master)
+             if not name:
+                 name = "Anonymous" # Default name if none entered
+             elif len(name) > 12:
+                 name = name[:12] # Truncate long names
+             self.player_name = name
+
+             entry = {
+                 "name": name,
+                 "score": self.final_time,
+                 "settings": settings_str, # Store game settings with the score
+                 "session": self.journal.session # The journaled game, to verify the score
+             }
+             self.save_leaderboard(entry)
+
+    def open_leaderboard(self):
+        """Opens the leaderboard database; runs on the worker thread, before any task that uses it."""
+        self.leaderboard = LeaderboardStore(LEADERBOARD_DB, json_path=LEADERBOARD_JSON)
+        self.leaderboard_cache = LeaderboardCache(self.leaderboard)
+
+    def leaderboard_opened(self, result):
+        self.leaderboard_view.cache = self.leaderboard_cache
+        self.load_leaderboard_display()
+
+    def leaderboard_failed(self, error):
+        log.error("Could not open leaderboard %s: %s", LEADERBOARD_DB, error)
+
+    def load_leaderboard_display(self):
+        """Shows the leaderboard for the current settings; it is read on the worker thread."""
+        self.leaderboard_view.show(self.current_settings().label())
+
+
+def _seeded_questions(settings, set_number):
+    batch = seeded_batch(settings, NUM_QUESTIONS, set_number)
+    return batch.seed, iter(batch)
+
+
+def _question_stream(settings, seed):
+    """A question stream with its first question already generated."""
+    stream = question_stream(settings, random.Random(seed))
+    return seed, itertools.chain([next(stream)], stream)
+
+
+def _trace_game():
+    """Times the game's phases with tracing spans (does nothing unless --trace was given)."""
+    tracing.instrument(MathGameGUI, "generate_questions", "_questions_ready", "_seen_by", "_stats_of",
+                       "_unseen_batch", "_unseen_stream", "_adaptive_questions", "setup_game", "start_game",
+                       "begin_game", "begin_play", "display_question", "check_answer", "show_answer_result",
+                       "end_game", "update_leaderboard", "save_leaderboard", "load_leaderboard_display")
+    tracing.instrument(MathGameGUI, "enable_options", "disable_options", category="widgets")
+    tracing.instrument(sys.modules[__name__], "_seeded_questions", "_question_stream", "append_records",
+                       "append_record", prefix="math_game")
+    tracing.instrument(QuestionPool, "get", "get_nowait", "generate", "prefetch")
+    tracing.instrument(LeaderboardStore, "add_score", "top", "page", "count", "standing", "settings_labels",
+                       category="leaderboard")
+    tracing.instrument(LeaderboardCache, "top", "page", "count", "revalidate", "score_saved",
+                       category="leaderboard")
+    tracing.instrument(LeaderboardView, "show", "refresh", "score_added", "show_rows", "scroll_to",
+                       category="display")
+    tracing.instrument(SeenQuestions, "for_player", "fresh_batch", "save")
+    tracing.instrument(PlayerStats, "for_player", "save")
+
+
+# --- Main Execution ---
+def main(argv=None):
+    options = argparse.ArgumentParser(description="Play Quick Math Challenge in a window.")
+    options.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the game's phases to FILE")
+    options.add_argument("--profile", metavar="FILE", help="profile the main thread with cProfile into FILE")
+    args = options.parse_args(argv)
+    tracing.start(args.trace, args.profile)
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    _trace_game()
+    root = tk.Tk()
+    # Apply theme before creating widgets if possible
+    try:
+        ttk.Style().theme_use('clam') # Or 'alt', 'default', 'classic'
+    except tk.TclError:
+        print("Themes not available, using default.")
+    game_gui = MathGameGUI(root)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
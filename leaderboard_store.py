@@ -0,0 +1,433 @@
+"""SQLite leaderboard store for Quick Math Challenge.
+
+Every finished game is kept, and each settings combination has its own
+ranking. Adding a score is a few indexed inserts instead of rewriting the
+whole leaderboard file, and the old JSON leaderboard is imported the first
+time the store is opened.
+
+Ranks and percentiles come from a Fenwick tree of score counts per 10 ms
+bucket, stored in the `rank_tree` table, so they take O(log n) lookups
+instead of counting every faster score.
+
+A score can name the session_journal record of the game it came from, so
+the board can be audited by replaying the games.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+
+LEADERBOARD_DB = "math_game_leaderboard.db"
+LEADERBOARD_JSON = "math_game_leaderboard.json" # Old leaderboard, imported into LEADERBOARD_DB
+# The old game's times also counted its ten 400 ms "Correct!" pauses; scores
+# are now only the time questions were on screen, so imports drop the pauses
+LEGACY_PAUSE_SECONDS = 4.0
+
+BUCKET_SECONDS = 0.01
+BUCKETS = 1 << 17 # Scores past ~21 minutes all share the last bucket
+PAGE_BLOCK = 64 # Rows LeaderboardCache reads from the store at a time
+_ALL_SETTINGS = "" # rank_tree key for the ranking across all settings
+
+# Orders a board can be paged in; "time" is the ranking
+SORTS = ("time", "name", "date")
+_ORDER_COLUMNS = {"name": ("name", "settings", "score", "id"), "date": ("created", "id")}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    score REAL NOT NULL,
+    settings TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    created REAL NOT NULL,
+    session INTEGER -- session_journal id of the game, if it was recorded
+);
+CREATE INDEX IF NOT EXISTS scores_by_settings ON scores (settings, bucket, score);
+CREATE INDEX IF NOT EXISTS scores_by_bucket ON scores (bucket, score);
+CREATE INDEX IF NOT EXISTS scores_by_player ON scores (name, settings, score);
+CREATE INDEX IF NOT EXISTS scores_by_settings_name ON scores (settings, name, score);
+CREATE INDEX IF NOT EXISTS scores_by_date ON scores (settings, created);
+CREATE INDEX IF NOT EXISTS scores_by_created ON scores (created);
+CREATE TABLE IF NOT EXISTS rank_tree (
+    settings TEXT NOT NULL,
+    node INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (settings, node)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _bucket(score):
+    """1-based rank_tree bucket of a score; monotonic in the score."""
+    return min(max(int(score / BUCKET_SECONDS), 0), BUCKETS - 1) + 1
+
+
+def _update_nodes(bucket):
+    while bucket <= BUCKETS:
+        yield bucket
+        bucket += bucket & -bucket
+
+
+def _prefix_nodes(bucket):
+    while bucket > 0:
+        yield bucket
+        bucket -= bucket & -bucket
+
+
+class LeaderboardStore:
+    """Keeps every score in an indexed SQLite database.
+
+    Rankings are per settings string (e.g. '2op 2dig +-'); pass settings=None
+    to rank across all settings. One connection is opened and reused; it may
+    be shared between threads, calls are serialized with a lock.
+    """
+
+    def __init__(self, path=LEADERBOARD_DB, json_path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL") # Safe with WAL, and much faster
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(scores)")]
+            if "session" not in columns: # Created before games were journaled
+                self._conn.execute("ALTER TABLE scores ADD COLUMN session INTEGER")
+        if json_path:
+            self._migrate_json(json_path)
+
+    def _migrate_json(self, json_path):
+        """Imports an old JSON leaderboard once."""
+        if self._meta("json_migrated") or not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r') as f:
+                content = f.read()
+            entries = json.loads(content) if content.strip() else []
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not import old leaderboard {json_path}: {e}")
+            return
+        created = os.path.getmtime(json_path)
+        rows = [(entry.get('name', '???'), max(entry.get('score', 0.0) - LEGACY_PAUSE_SECONDS, 0.0),
+                 entry.get('settings', 'N/A'), created) for entry in entries]
+        # One transaction, so a crash can't leave the scores imported but not marked (or the reverse)
+        with self._lock, self._conn:
+            self._insert(rows)
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', ?)", (json_path,))
+
+    def _meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _insert(self, rows):
+        """Inserts (name, score, settings, created[, session]) rows; the caller holds the lock."""
+        records = [(name, score, settings, _bucket(score), created, session[0] if session else None)
+                   for name, score, settings, created, *session in rows]
+        bucket_counts = Counter((settings, bucket) for _, _, settings, bucket, _, _ in records)
+        tree_counts = Counter()
+        for (settings, bucket), n in bucket_counts.items():
+            for node in _update_nodes(bucket):
+                tree_counts[settings, node] += n
+                tree_counts[_ALL_SETTINGS, node] += n
+        self._conn.executemany(
+            "INSERT INTO scores (name, score, settings, bucket, created, session) VALUES (?, ?, ?, ?, ?, ?)",
+            records)
+        self._conn.executemany(
+            "INSERT INTO rank_tree VALUES (?, ?, ?) "
+            "ON CONFLICT (settings, node) DO UPDATE SET n = n + excluded.n",
+            [(settings, node, n) for (settings, node), n in tree_counts.items()])
+
+    def add_score(self, name, score, settings, session=None):
+        """Records one finished game; `session` is its journal id, if it was journaled."""
+        with self._lock, self._conn:
+            self._insert([(name, score, settings, time.time(), session)])
+
+    def add_scores(self, rows):
+        """Records many (name, score, settings, created[, session]) rows in one transaction."""
+        with self._lock, self._conn:
+            self._insert(rows)
+
+    def audit_rows(self, batch_size=10_000):
+        """Yields (id, name, score, settings, session) for every score, in id order."""
+        last_id = 0
+        while True:
+            rows = self._query("SELECT id, name, score, settings, session FROM scores "
+                               "WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+
+    def top(self, settings=None, limit=10):
+        """Returns the `limit` fastest entries as dicts, fastest first."""
+        if settings is None:
+            rows = self._query("SELECT name, score, settings FROM scores "
+                               "ORDER BY bucket, score LIMIT ?", (limit,))
+        else:
+            rows = self._query("SELECT name, score, settings FROM scores WHERE settings = ? "
+                               "ORDER BY bucket, score LIMIT ?", (settings, limit))
+        return [{"name": name, "score": score, "settings": settings} for name, score, settings in rows]
+
+    def _page_rows(self, settings, where, params, order, limit, offset):
+        where = ["settings = ?"] + where if settings is not None else where
+        params = ([settings] if settings is not None else []) + params
+        sql = "SELECT id, name, score, settings, created FROM scores"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._query(sql + f" ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset])
+
+    def _seek(self, key, offset):
+        """Finds the score at 0-based `offset` in time order by descending the rank tree.
+
+        Returns (bucket, offset within the bucket).
+        """
+        position = 0
+        step = BUCKETS
+        while step:
+            node = position + step
+            if node <= BUCKETS:
+                row = self._query("SELECT n FROM rank_tree WHERE settings = ? AND node = ?", (key, node))
+                n = row[0][0] if row else 0
+                if n <= offset:
+                    position = node
+                    offset -= n
+            step >>= 1
+        return position + 1, offset
+
+    def page(self, settings=None, sort="time", descending=False, offset=0, limit=20):
+        """Returns entries `offset` .. `offset + limit - 1` of a board in `sort` order.
+
+        Entries are dicts with the id, name, score, settings and created time.
+        Pages in time order (the ranking) are found through the rank tree, so
+        they cost the same anywhere in the board; other orders page through
+        an index.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort '{sort}'")
+        with self._lock:
+            if sort == "time":
+                if descending: # The same rows as ascending, read from the other end
+                    total = self.count(settings)
+                    end = max(total - offset, 0)
+                    offset, limit = max(end - limit, 0), end - max(end - limit, 0)
+                bucket, skip = self._seek(_ALL_SETTINGS if settings is None else settings, offset)
+                rows = self._page_rows(settings, ["bucket >= ?"], [bucket], "bucket, score, id", limit, skip)
+                if descending:
+                    rows.reverse()
+            else:
+                direction = " DESC" if descending else ""
+                order = ", ".join(column + direction for column in _ORDER_COLUMNS[sort])
+                rows = self._page_rows(settings, [], [], order, limit, offset)
+        return [{"id": id_, "name": name, "score": score, "settings": settings, "created": created}
+                for id_, name, score, settings, created in rows]
+
+    def settings_labels(self):
+        """Every settings string that has scores, in order."""
+        labels = []
+        with self._lock:
+            # One index lookup per settings string instead of scanning every score
+            row = self._conn.execute("SELECT MIN(settings) FROM scores").fetchone()
+            while row[0] is not None:
+                labels.append(row[0])
+                row = self._conn.execute("SELECT MIN(settings) FROM scores WHERE settings > ?",
+                                         (row[0],)).fetchone()
+        return labels
+
+    def _tree_sum(self, key, bucket):
+        """Number of scores in buckets 1..bucket."""
+        nodes = list(_prefix_nodes(bucket))
+        if not nodes:
+            return 0
+        placeholders = ",".join("?" * len(nodes))
+        return self._query(f"SELECT COALESCE(SUM(n), 0) FROM rank_tree "
+                           f"WHERE settings = ? AND node IN ({placeholders})", [key] + nodes)[0][0]
+
+    def _count_up_to(self, score, settings, inclusive):
+        """Number of scores below `score` (or equal to it too, if `inclusive`)."""
+        bucket = _bucket(score)
+        compare = "<=" if inclusive else "<"
+        if settings is None:
+            in_bucket = self._query(f"SELECT COUNT(*) FROM scores WHERE bucket = ? AND score {compare} ?",
+                                    (bucket, score))
+        else:
+            in_bucket = self._query(f"SELECT COUNT(*) FROM scores "
+                                    f"WHERE settings = ? AND bucket = ? AND score {compare} ?",
+                                    (settings, bucket, score))
+        key = _ALL_SETTINGS if settings is None else settings
+        return self._tree_sum(key, bucket - 1) + in_bucket[0][0]
+
+    def count(self, settings=None):
+        """Number of scores recorded (for one settings string, or overall)."""
+        return self._tree_sum(_ALL_SETTINGS if settings is None else settings, BUCKETS)
+
+    def rank(self, score, settings=None):
+        """Rank a time of `score` seconds has (or would have), 1 being fastest."""
+        return self._count_up_to(score, settings, inclusive=False) + 1
+
+    def position(self, score, settings=None):
+        """0-based place in time order of the newest score equal to `score`."""
+        return self._count_up_to(score, settings, inclusive=True) - 1
+
+    def player_rank(self, name, settings):
+        """Rank of `name`'s best time for `settings`, or None if they have none."""
+        best = self._query("SELECT MIN(score) FROM scores WHERE name = ? AND settings = ?",
+                           (name, settings))[0][0]
+        return None if best is None else self.rank(best, settings)
+
+    def percentile(self, score, settings=None):
+        """Percentage of recorded scores that are slower than `score`."""
+        total = self.count(settings)
+        if not total:
+            return 100.0
+        slower = total - self._count_up_to(score, settings, inclusive=True)
+        return 100.0 * slower / total
+
+    def standing(self, score, settings=None):
+        """Returns (rank, total, percentile) for `score` from a single read transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                return self.rank(score, settings), self.count(settings), self.percentile(score, settings)
+            finally:
+                self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _file_signature(path):
+    """(inode, size, mtime) of the database and its WAL file; cheap to compare."""
+    signature = []
+    for name in (path, path + "-wal"):
+        try:
+            st = os.stat(name)
+            signature.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class LeaderboardCache:
+    """Keeps the boards shown in the game in memory.
+
+    Before serving a board the database files are stat()ed, and the boards
+    are only re-read when another process has changed them. Scores added
+    through the cache are inserted into the cached boards directly, so a
+    finished game does not re-read the board it just wrote to.
+
+    Longer boards are paged with `page`, which keeps blocks of PAGE_BLOCK
+    rows so scrolling through a board only reads each block once.
+    """
+
+    def __init__(self, store, max_blocks=256):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.max_blocks = max_blocks
+        self._boards = {} # (settings, limit) -> list of entries, fastest first
+        self._blocks = OrderedDict() # (settings, sort, descending, block) -> entries, LRU order
+        self._counts = {} # settings -> number of scores
+        self._signature = None
+
+    def revalidate(self):
+        """Drops everything cached if another process changed the database."""
+        signature = _file_signature(self.store.path)
+        if signature != self._signature:
+            self._boards.clear()
+            self._blocks.clear()
+            self._counts.clear()
+            self._signature = signature
+
+    def top(self, settings=None, limit=10):
+        """Same as LeaderboardStore.top, served from memory when unchanged."""
+        self.revalidate()
+        board = self._boards.get((settings, limit))
+        if board is None:
+            self.misses += 1
+            board = self.store.top(settings, limit)
+            self._boards[settings, limit] = board
+        else:
+            self.hits += 1
+        return board
+
+    def count(self, settings=None):
+        """Same as LeaderboardStore.count, served from memory when unchanged."""
+        self.revalidate()
+        if settings not in self._counts:
+            self._counts[settings] = self.store.count(settings)
+        return self._counts[settings]
+
+    def page(self, settings=None, sort="time", descending=False, offset=0, limit=20):
+        """Same as LeaderboardStore.page, read from the store a block at a time."""
+        self.revalidate()
+        entries = []
+        first, last = offset // PAGE_BLOCK, (offset + limit - 1) // PAGE_BLOCK
+        for block in range(first, last + 1):
+            key = (settings, sort, descending, block)
+            rows = self._blocks.get(key)
+            if rows is None:
+                self.misses += 1
+                rows = self._blocks[key] = self.store.page(settings, sort, descending,
+                                                           block * PAGE_BLOCK, PAGE_BLOCK)
+                if len(self._blocks) > self.max_blocks:
+                    self._blocks.popitem(last=False)
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(key)
+            entries.extend(rows)
+        start = offset - first * PAGE_BLOCK
+        return entries[start:start + limit]
+
+    def add_score(self, name, score, settings, session=None):
+        """Records a score and updates the cached boards in place."""
+        before = self.signature()
+        self.store.add_score(name, score, settings, session)
+        self.score_saved(name, score, settings, before, self.signature())
+
+    def signature(self):
+        """The database files' signature; safe to read from any thread."""
+        return _file_signature(self.store.path)
+
+    def score_saved(self, name, score, settings, before, after):
+        """Updates the cached boards for a score already added to the store.
+
+        For scores added to the store directly (e.g. by the game's worker
+        thread): `before` and `after` are the `signature`s read just before
+        and after the write. The
+        boards are only updated in place if they were read at `before`;
+        otherwise they are revalidated, as they may already hold the new
+        score or be missing another process's. Returns True if updated in
+        place, False if revalidated.
+        """
+        if self._signature != before:
+            self.revalidate()
+            return False
+        entry = {"name": name, "score": score, "settings": settings}
+        for (board_settings, limit), board in self._boards.items():
+            if board_settings in (None, settings):
+                board.insert(bisect_right([e["score"] for e in board], score), entry)
+                del board[limit:]
+        # Every later row of a paged board moves down one; re-read those boards as needed
+        for key in [key for key in self._blocks if key[0] in (None, settings)]:
+            del self._blocks[key]
+        for key in (None, settings):
+            if key in self._counts:
+                self._counts[key] += 1
+        self._signature = after
+        return True
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,261 @@
+"""Scrollable leaderboard widget for Quick Math Challenge.
+
+The view is a ttk.Treeview that only ever holds the rows on screen. The
+scrollbar is driven by the board's row count, and scrolling reads the rows
+that come into view from a LeaderboardCache, so a board of 100k scores costs
+the same to show and scroll as a board of 10. Headings sort the board and
+a combobox filters it by settings.
+
+The cache is only ever read on the BackgroundTasks worker thread, and the
+rows are filled in when a read comes back, so the Tk thread never waits for
+the database. While a read is running, later requests (e.g. while dragging
+the scrollbar) are merged into one read of the latest position.
+"""
+import logging
+import time
+import tkinter as tk
+from tkinter import ttk
+
+ALL_SETTINGS = "All settings"
+VISIBLE_ROWS = 7
+
+log = logging.getLogger("math_game")
+
+# Column id -> (heading, width, sort it orders by or None)
+_COLUMNS = {
+    "place": ("#", 55, "time"),
+    "name": ("Name", 105, "name"),
+    "score": ("Time(s)", 70, "time"),
+    "settings": ("Settings", 105, None),
+    "date": ("Date", 85, "date"),
+}
+
+
+class LeaderboardView(ttk.Frame):
+    """Shows one page of a board at a time from a LeaderboardCache.
+
+    Reads run through `background` (a ui_tasks.BackgroundTasks). Until
+    `cache` is set (e.g. while the database is being opened) the view stays
+    empty.
+    """
+
+    def __init__(self, master, background, cache=None, rows=VISIBLE_ROWS, **kwargs):
+        super().__init__(master, **kwargs)
+        self.background = background
+        self.cache = cache
+        self.rows = rows
+        self.settings = None # Filter; None shows every settings
+        self.sort = "time"
+        self.descending = False
+        self.offset = 0 # Board row shown at the top
+        self.total = 0
+        self._static = False # Showing rows that aren't a board (race standings)
+        self._reading = False # A read of the board is running on the worker thread
+        self._read_again = False # The board changed while it was being read
+
+        top = ttk.Frame(self)
+        top.pack(fill=tk.X)
+        self.title_label = ttk.Label(top, text="", font=("Arial", 10, "bold"))
+        self.title_label.pack(side=tk.LEFT)
+        self.filter_box = ttk.Combobox(top, state="readonly", width=14, postcommand=self._load_filters)
+        self.filter_box.pack(side=tk.RIGHT)
+        self.filter_box.bind("<<ComboboxSelected>>", self._filter_selected)
+
+        body = ttk.Frame(self)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(body, columns=list(_COLUMNS), show="headings", height=rows,
+                                 selectmode="none")
+        for column, (heading, width, sort) in _COLUMNS.items():
+            command = (lambda sort=sort: self.sort_by(sort)) if sort else ""
+            self.tree.heading(column, text=heading, command=command)
+            self.tree.column(column, width=width, minwidth=width, stretch=column == "name",
+                             anchor=tk.W if column in ("name", "settings") else tk.E)
+        self.tree.tag_configure("new", background="#fff3b0")
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self._scroll)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self._wheel)
+
+    # --- Board state ---
+
+    def show(self, settings):
+        """Shows the board for a settings string (None for all settings) from the top."""
+        self.settings = settings
+        self.filter_box.set(settings or ALL_SETTINGS)
+        self.offset = 0
+        self.refresh()
+
+    def sort_by(self, sort):
+        """Sorts by `sort`; choosing the current sort again flips the direction."""
+        if self._static:
+            return
+        if sort == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort, self.descending = sort, sort == "date" # Newest first
+        self.offset = 0
+        self.refresh()
+
+    def refresh(self):
+        """Re-reads the row count and the visible rows."""
+        self._static = False
+        self._update_headings()
+        self._read()
+
+    def _read(self):
+        """Reads the board at the current offset on the worker thread."""
+        if self.cache is None:
+            return
+        if self._reading:
+            self._read_again = True
+            return
+        self._reading, self._read_again = True, False
+        self.background.submit(_read_board, self.cache, self.settings, self.sort, self.descending,
+                               self.offset, self.rows, on_done=self._board_read, on_error=self._read_failed)
+
+    def _board_read(self, board):
+        self._reading = False
+        if self._read_again: # Only show the latest board
+            self._read()
+            return
+        if self._static:
+            return
+        self.total, self.offset, entries = board
+        name = self.settings or ALL_SETTINGS
+        self.title_label.config(text=f"Leaderboard: {name} ({self.total} games)" if self.total
+                                else f"No scores yet for {name}")
+        self._render(entries)
+        if not self.filter_box["values"]:
+            self._load_filters()
+
+    def _read_failed(self, error):
+        self._reading = False
+        log.warning("Could not read the leaderboard: %s", error)
+        if self._read_again:
+            self._read()
+
+    def _update_headings(self):
+        arrow = " ▼" if self.descending else " ▲"
+        for column, (heading, _, sort) in _COLUMNS.items():
+            shown = sort == self.sort and column != "place"
+            self.tree.heading(column, text=heading + (arrow if shown else ""))
+
+    def _render(self, entries):
+        """Fills the tree with the visible rows, reusing the existing items."""
+        items = self.tree.get_children()
+        for i, entry in enumerate(entries):
+            values = self._values(self.offset + i, entry)
+            if i < len(items):
+                self.tree.item(items[i], values=values, tags=())
+            else:
+                self.tree.insert("", tk.END, values=values)
+        if len(items) > len(entries):
+            self.tree.delete(*items[len(entries):])
+        self._update_scrollbar()
+
+    def _values(self, place, entry):
+        created = time.strftime("%Y-%m-%d", time.localtime(entry["created"])) if entry.get("created") else ""
+        return (place + 1, entry["name"], f"{entry['score']:.2f}", entry["settings"], created)
+
+    def _update_scrollbar(self):
+        if self.total <= self.rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / self.total, (self.offset + self.rows) / self.total)
+
+    # --- New scores ---
+
+    def score_added(self, entry, positions):
+        """Puts a just-saved score into the board without redrawing the other rows.
+
+        `positions` maps the boards the score is on (None for all settings) to
+        its 0-based place in time order, as read by the thread that saved it.
+        With no `positions` the visible rows are re-read instead.
+        """
+        if self._static or self.settings not in (None, entry["settings"]):
+            return
+        if positions is None:
+            self.refresh()
+            return
+        self.total += 1
+        entry = dict(entry, created=entry.get("created") or time.time())
+        if self.sort == "time":
+            place = positions[self.settings]
+            if self.descending:
+                place = self.total - 1 - place
+        elif self.sort == "date":
+            place = 0 if self.descending else self.total - 1
+        else: # Where a name lands is up to the database; just re-read the visible rows
+            self.refresh()
+            return
+        if place < self.offset: # Keep the same rows on screen, each now one place lower
+            self.offset += 1
+            for i, item in enumerate(self.tree.get_children(), self.offset):
+                self.tree.set(item, "place", i + 1)
+        elif place < self.offset + self.rows:
+            index = place - self.offset
+            self.tree.insert("", index, values=self._values(place, entry), tags=("new",))
+            items = self.tree.get_children()
+            if len(items) > self.rows:
+                self.tree.delete(items[-1])
+            for i, item in enumerate(self.tree.get_children()[index + 1:], place + 1):
+                self.tree.set(item, "place", i + 1) # Rows below moved down one place
+        self.title_label.config(text=f"Leaderboard: {self.settings or ALL_SETTINGS} ({self.total} games)")
+        self._update_scrollbar()
+
+    # --- Other content ---
+
+    def show_rows(self, title, rows):
+        """Shows fixed rows of (place, name, time text) instead of a board, e.g. race standings."""
+        self._static = True
+        self.title_label.config(text=title)
+        self.tree.delete(*self.tree.get_children())
+        for place, name, progress in rows:
+            self.tree.insert("", tk.END, values=(place, name, progress, "", ""))
+        self.scrollbar.set(0.0, 1.0)
+
+    # --- Scrolling and filtering ---
+
+    def scroll_to(self, offset):
+        if self._static:
+            return
+        offset = max(0, min(int(offset), self.total - self.rows))
+        if offset != self.offset:
+            self.offset = offset
+            self._update_scrollbar() # The rows follow when they have been read
+            self._read()
+
+    def _scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.total)
+        elif action == "scroll":
+            step = self.rows if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def _wheel(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"
+
+    def _load_filters(self):
+        """Re-reads the settings to filter by; the list is updated when they have been read."""
+        if self.cache is None:
+            return
+        self.background.submit(self.cache.store.settings_labels, on_done=self._filters_read)
+
+    def _filters_read(self, labels):
+        self.filter_box["values"] = [ALL_SETTINGS] + labels
+
+    def _filter_selected(self, event):
+        choice = self.filter_box.get()
+        self.show(None if choice == ALL_SETTINGS else choice)
+
+
+def _read_board(cache, settings, sort, descending, offset, rows):
+    """Reads (total, offset, entries) of a board on the worker thread; an offset past the end is moved back."""
+    total = cache.count(settings)
+    offset = max(0, min(offset, total - rows))
+    return total, offset, cache.page(settings, sort, descending, offset, rows)
@@ -0,0 +1,249 @@
+"""Per-player answer statistics, and adaptive games built from them.
+
+Every question falls in a cell: its operator (or "mix"), number of digits
+and number of operands. For each cell a player has played, `PlayerStats`
+keeps streaming aggregates that are updated in O(1) as each answer is
+checked:
+    - count, mean and variance of the correct answers' times (Welford's
+      algorithm, so no individual times are kept),
+    - accuracy, decayed so recent answers count most: the latest answer
+      weighs ACCURACY_DECAY, or 1/n while there are fewer than
+      1/ACCURACY_DECAY answers.
+All cells live in preallocated flat arrays, so a player takes a fixed
+CELLS * 40 bytes (about 7 KB) however much they play.
+
+In an adaptive game, each question comes from a cell up to the chosen
+settings (every enabled operator, 1 up to the chosen digits and 2 up to the
+chosen operands), picked at random weighted by how slow the player is in it:
+mean time divided by accuracy. Cells with too few answers to tell get the
+weight of the slowest known cell, so they are tried too.
+
+Stats are saved per player in STATS_DIR:
+    magic b"MPS1", number of cells (u16), then the attempts and timed
+    answers (u64 per cell), and the mean, M2 and accuracy (f64 per cell),
+    little-endian
+
+    python player_stats.py Ana
+"""
+import os
+import random
+import sys
+from array import array
+
+from atomic_file import atomic_open
+from question_engine import (MIXED, OP_NAMES, MIN_OPERANDS, MAX_OPERANDS, MAX_DIGITS, generate_op_batch)
+from seen_questions import player_file
+
+STATS_DIR = "math_game_stats"
+ACCURACY_DECAY = 0.1
+MIN_SAMPLES = 3 # Timed answers before a cell's own weight is used
+MIN_ACCURACY = 0.25 # So a cell's weight is at most 4 times its mean time
+
+OPERAND_COUNTS = MAX_OPERANDS - MIN_OPERANDS + 1
+CELLS = len(OP_NAMES) * MAX_DIGITS * OPERAND_COUNTS
+
+MAGIC = b"MPS1"
+_COUNT_FIELDS = ("attempts", "answers")
+_FLOAT_FIELDS = ("mean", "m2", "accuracy")
+
+
+def cell_of(op, settings):
+    """The cell of a question with operator code `op` played with `settings`."""
+    return (op * MAX_DIGITS + settings.digits - 1) * OPERAND_COUNTS + settings.operands - MIN_OPERANDS
+
+
+def cell_key(cell):
+    """(op, digits, operands) of a cell."""
+    if not 0 <= cell < CELLS:
+        raise ValueError(f"No question cell {cell}")
+    rest, operands = divmod(cell, OPERAND_COUNTS)
+    op, digits = divmod(rest, MAX_DIGITS)
+    return op, digits + 1, operands + MIN_OPERANDS
+
+
+def cell_settings(settings, cell):
+    """(op, settings) of the questions in `cell`, with the operators enabled by `settings`."""
+    op, digits, operands = cell_key(cell)
+    return op, settings._replace(operands=operands, digits=digits)
+
+
+def cell_label(cell):
+    """Short description of a cell, e.g. '× 2op 3dig' (like telemetry's groups)."""
+    op, digits, operands = cell_key(cell)
+    return f"{OP_NAMES[op]} {operands}op {digits}dig"
+
+
+def cell_question(settings, cell, rng):
+    """Generates one question of `cell` with `rng`; replaying the same cells and rng gives the same questions."""
+    op, settings = cell_settings(settings, cell)
+    return generate_op_batch(settings, op, 1, rng)[0]
+
+
+def adaptive_cells(settings):
+    """The cells an adaptive game with `settings` picks its questions from."""
+    ops = [MIXED] if settings.mixed else settings.op_codes()
+    return [cell_of(op, settings._replace(digits=digits, operands=operands))
+            for op in ops for digits in range(1, settings.digits + 1)
+            for operands in range(MIN_OPERANDS, settings.operands + 1)]
+
+
+class PlayerStats:
+    """Streaming answer statistics of one player, per cell."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.attempts = array("Q", bytes(8 * CELLS)) # Answers graded right or wrong
+        self.answers = array("Q", bytes(8 * CELLS)) # Correct answers, which are timed
+        self.mean = array("d", bytes(8 * CELLS)) # Seconds per correct answer
+        self.m2 = array("d", bytes(8 * CELLS)) # Sum of squared differences from the mean
+        self.accuracy = array("d", bytes(8 * CELLS))
+
+    @staticmethod
+    def for_player_path(name, directory=STATS_DIR):
+        """The file a player's stats are saved in."""
+        return player_file(name, directory, ".stats")
+
+    @classmethod
+    def for_player(cls, name, directory=STATS_DIR):
+        """Loads the player's stats, or starts empty ones."""
+        stats = cls(cls.for_player_path(name, directory))
+        try:
+            stats.load()
+        except FileNotFoundError:
+            pass
+        return stats
+
+    def _attempt(self, cell, hit):
+        attempts = self.attempts[cell] + 1
+        self.attempts[cell] = attempts
+        accuracy = self.accuracy[cell]
+        self.accuracy[cell] = accuracy + (hit - accuracy) * max(ACCURACY_DECAY, 1 / attempts)
+
+    def correct(self, cell, seconds):
+        """Records a correct answer that took `seconds`."""
+        self._attempt(cell, 1.0)
+        count = self.answers[cell] + 1
+        self.answers[cell] = count
+        mean = self.mean[cell]
+        delta = seconds - mean
+        mean += delta / count
+        self.mean[cell] = mean
+        self.m2[cell] += delta * (seconds - mean)
+
+    def wrong(self, cell):
+        """Records a wrong answer."""
+        self._attempt(cell, 0.0)
+
+    def variance(self, cell):
+        count = self.answers[cell]
+        return self.m2[cell] / (count - 1) if count > 1 else 0.0
+
+    def slowness(self, cell):
+        """Expected seconds per correct answer in `cell`, or None with too few answers to tell."""
+        if self.answers[cell] < MIN_SAMPLES:
+            return None
+        return self.mean[cell] / max(self.accuracy[cell], MIN_ACCURACY)
+
+    def weights(self, cells):
+        """How likely an adaptive game is to pick each of `cells`."""
+        weights = [self.slowness(cell) for cell in cells]
+        unknown = max((weight for weight in weights if weight is not None), default=1.0)
+        return [unknown if weight is None else weight for weight in weights]
+
+    def played_cells(self):
+        return [cell for cell in range(CELLS) if self.attempts[cell]]
+
+    def copy(self):
+        stats = PlayerStats(self.path)
+        for field in _COUNT_FIELDS + _FLOAT_FIELDS:
+            setattr(stats, field, array(getattr(self, field).typecode, getattr(self, field)))
+        return stats
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a player stats file")
+        cells = int.from_bytes(data[len(MAGIC):len(MAGIC) + 2], "little")
+        if cells != CELLS:
+            raise ValueError(f"{path} has {cells} cells, expected {CELLS}")
+        offset = len(MAGIC) + 2
+        fields = {}
+        for field in _COUNT_FIELDS + _FLOAT_FIELDS:
+            values = array("Q" if field in _COUNT_FIELDS else "d")
+            values.frombytes(data[offset:offset + 8 * CELLS])
+            if len(values) != CELLS:
+                raise ValueError(f"{path} is truncated")
+            if sys.byteorder == "big":
+                values.byteswap()
+            fields[field] = values
+            offset += 8 * CELLS
+        for field, values in fields.items():
+            setattr(self, field, values)
+
+    def save(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with atomic_open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(CELLS.to_bytes(2, "little"))
+            for field in _COUNT_FIELDS + _FLOAT_FIELDS:
+                values = getattr(self, field)
+                if sys.byteorder == "big":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                f.write(values.tobytes())
+
+
+class AdaptiveQuestions:
+    """Endless questions within `settings`, each from a cell picked by the player's weights.
+
+    `cell` and `settings` are those of the question returned last. The
+    questions only depend on `seed` and the cells picked, so a game can be
+    replayed from the cells (see `cell_question`).
+    """
+
+    def __init__(self, stats, settings, seed, chooser=random):
+        self.stats = stats
+        self.game_settings = settings
+        self.cells = adaptive_cells(settings)
+        self.rng = random.Random(seed)
+        self.chooser = chooser # Picks the cells; separate, so it doesn't change the questions
+        self.cell = None
+        self.settings = settings
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        cell = self.cell = self.chooser.choices(self.cells, self.stats.weights(self.cells))[0]
+        op, self.settings = cell_settings(self.game_settings, cell)
+        return generate_op_batch(self.settings, op, 1, self.rng)[0]
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Show a player's answer statistics, slowest first.")
+    parser.add_argument("name")
+    parser.add_argument("--dir", default=STATS_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        stats = PlayerStats(PlayerStats.for_player_path(args.name, args.dir))
+        stats.load()
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    cells = stats.played_cells()
+    weights = dict(zip(cells, stats.weights(cells)))
+    print(f"{'cell':<16}{'answers':>8}{'mean':>8}{'sd':>8}{'accuracy':>9}{'weight':>8}")
+    for cell in sorted(cells, key=weights.get, reverse=True):
+        print(f"{cell_label(cell):<16}{stats.answers[cell]:>8}"
+              f"{stats.mean[cell]:>7.2f}s{stats.variance(cell) ** 0.5:>7.2f}s"
+              f"{stats.accuracy[cell]:>9.0%}{weights[cell]:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""Headless question generator for Quick Math Challenge.
+
+Questions are generated in batches and stored as flat arrays (operands,
+operator codes and answers) instead of one dict per question. The question
+text is only built when a question is actually shown. Nothing in here
+imports Tk, so it can be used for offline pre-generation and servers too.
+
+With `GameSettings.mixed`, each question is instead an expression tree that
+mixes the enabled operators, e.g. `12 + 3 × 4 - 8 ÷ 2`, evaluated with the
+usual precedence (see `generate_expressions`).
+"""
+import random
+import sys
+from array import array
+from collections import namedtuple
+from functools import lru_cache, reduce
+from operator import add, sub, mul, floordiv
+
+# Operator codes index into this string ('×' and '÷' are used for display)
+OPERATORS = "+-×÷"
+ADD, SUB, MUL, DIV = range(len(OPERATORS))
+MIXED = len(OPERATORS) # Operator code of a mixed-operator question
+OP_NAMES = tuple(OPERATORS) + ("mix",)
+_FOLDS = (add, sub, mul, floordiv)
+_PRECEDENCE = (1, 1, 2, 2)
+
+NUM_QUESTIONS = 10 # Questions in a classic game
+SPRINT_SECONDS = 60
+
+# Game modes
+MODE_CLASSIC = "classic"  # NUM_QUESTIONS questions, as fast as possible
+MODE_SPRINT = "sprint"    # As many questions as possible in SPRINT_SECONDS
+MODE_ENDLESS = "endless"  # Until the first wrong answer
+MIN_OPERANDS, MAX_OPERANDS = 2, 4
+MIN_DIGITS, MAX_DIGITS = 1, 12
+MAX_STANDARD_DIGITS = 3 # More digits than this is "big numbers" mode
+
+
+class GameSettings(namedtuple("GameSettings", "operands digits add_sub mul_div mixed", defaults=(False,))):
+    """The options chosen in the 'Game Options' frame.
+
+    `mixed` questions mix the enabled operators in one expression.
+    """
+    __slots__ = ()
+
+    def op_codes(self):
+        """Returns the operator codes enabled by these settings."""
+        codes = []
+        if self.add_sub:
+            codes.extend([ADD, SUB])
+        if self.mul_div:
+            codes.extend([MUL, DIV])
+        return codes or [ADD] # Default to addition if no operations are selected
+
+    def digit_range(self):
+        """Returns the (min, max) operand values for the number of digits."""
+        if self.digits == 1: # Handle single digit (1-9)
+            return 1, 9
+        return 10**(self.digits-1), (10**self.digits) - 1
+
+    def fits_int64(self):
+        """True if every operand and answer for these settings fits in 64 bits."""
+        high = self.digit_range()[1]
+        return high ** self.operands < 2**63
+
+    def label(self):
+        """Short description used on the leaderboard, e.g. '2op 2dig +-'."""
+        ops = ("+-" if self.add_sub else "") + ("×÷" if self.mul_div else "")
+        return f"{self.operands}op {self.digits}dig {ops}" + (" mix" if self.mixed else "")
+
+
+def settings_from_ops(operands, digits, ops, mixed=False):
+    """Builds GameSettings from an operations string such as '+-', '×÷' (or '*/') or '+-×÷'."""
+    return GameSettings(operands, digits, "+" in ops or "-" in ops, any(op in ops for op in "×÷*/"), mixed)
+
+
+class Question(namedtuple("Question", "operands op answer")):
+    """A single question; the text is formatted on demand."""
+    __slots__ = ()
+
+    @property
+    def text(self):
+        return f" {OPERATORS[self.op]} ".join(map(str, self.operands)) + " = ?"
+
+
+class QuestionBatch:
+    """A batch of questions stored column-wise in flat arrays.
+
+    `columns[j]` holds the j-th operand of every question, `ops` the
+    operator code of every question and `answers` every answer. Columns and
+    answers are int64 arrays, or lists of ints when the values can outgrow
+    64 bits (big numbers mode).
+    Indexing a batch returns a `Question`.
+    """
+
+    def __init__(self, settings, columns, ops, answers, seed=None):
+        self.settings = settings
+        self.seed = seed # Set when the batch can be regenerated with seeded_batch
+        self.columns = columns
+        self.ops = ops
+        self.answers = answers
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, index):
+        return Question(tuple(column[index] for column in self.columns),
+                        self.ops[index], self.answers[index])
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self.ops)))
+
+    def text(self, index):
+        """Returns the display text of question `index`."""
+        return self[index].text
+
+    def texts(self):
+        """Returns the display text of every question, formatted column-wise in one pass."""
+        separators = [f" {OPERATORS[op]} " for op in self.ops]
+        return [separator.join(map(str, row)) + " = ?"
+                for separator, row in zip(separators, zip(*self.columns))]
+
+
+# Results of grade_answer
+ANSWER_CORRECT, ANSWER_WRONG, ANSWER_EMPTY, ANSWER_INVALID = "correct", "wrong", "empty", "invalid"
+
+
+def grade_answer(text, correct_answer):
+    """Checks a typed answer the way the game does, returning one of the ANSWER_* results."""
+    text = text.strip()
+    if not text: # Handle empty input
+        return ANSWER_EMPTY
+    try:
+        answer = int(text)
+    except ValueError:
+        return ANSWER_INVALID
+    return ANSWER_CORRECT if answer == correct_answer else ANSWER_WRONG
+
+
+def _random_words(rng, count):
+    """Returns `count` random 64-bit unsigned ints as an array."""
+    words = array("Q")
+    if count:
+        # Byte order matches the array so the values only depend on the rng state
+        words.frombytes(rng.getrandbits(64 * count).to_bytes(8 * count, sys.byteorder))
+    return words
+
+
+def uniform_ints(rng, count, low, high):
+    """Returns `count` ints drawn uniformly from [low, high].
+
+    Reducing a 64-bit word modulo the span has a bias of at most span / 2**64,
+    which is negligible for any range the game uses.
+    """
+    span = high - low + 1
+    return [low + word % span for word in _random_words(rng, count)]
+
+
+def _draw_ops(rng, codes, count):
+    """Draws one operator code per question, uniformly from `codes`."""
+    if len(codes) == 1 or not count:
+        return bytes(codes[:1]) * count
+    table = _op_table(tuple(codes))
+    return rng.getrandbits(8 * count).to_bytes(count, sys.byteorder).translate(table)
+
+
+@lru_cache(maxsize=None)
+def _op_table(codes):
+    """bytes.translate table mapping a random byte to one of `codes`."""
+    # There are always 2 or 4 codes, so masking a random byte is exactly uniform
+    mask = len(codes) - 1
+    return bytes(codes[byte & mask] for byte in range(256))
+
+
+def _fold(op, columns):
+    """Folds the operand columns left to right with operator `op`."""
+    return reduce(lambda acc, col: list(map(_FOLDS[op], acc, col)), columns[1:], columns[0])
+
+
+def _uniform_rows(op, rng, count, width, low, high):
+    columns = [uniform_ints(rng, count, low, high) for _ in range(width)]
+    return columns, _fold(op, columns)
+
+
+def _subtraction_rows(rng, count, width, low, high):
+    if width == 2:
+        # The larger number goes first, so the answer is never negative
+        first, second = uniform_ints(rng, count, low, high), uniform_ints(rng, count, low, high)
+        columns = [[a if a >= b else b for a, b in zip(first, second)],
+                   [b if a >= b else a for a, b in zip(first, second)]]
+        return columns, _fold(SUB, columns)
+    # With more numbers, the ones subtracted are drawn small enough to add up to at
+    # most `high`, then the first number is drawn from [their sum, high]. Every
+    # answer is non-negative by construction, and every number is in the digit range.
+    rest = [uniform_ints(rng, count, low, high // (width - 1)) for _ in range(width - 1)]
+    totals = _fold(ADD, rest)
+    first = [total + word % (high - total + 1) for total, word in zip(totals, _random_words(rng, count))]
+    return [first] + rest, list(map(sub, first, totals))
+
+
+def _divisor_products(width, smallest, high):
+    """Yields every tuple of `width` divisors >= smallest whose product is <= high."""
+    if width == 0:
+        yield ()
+        return
+    for divisor in range(smallest, high // smallest ** (width - 1) + 1):
+        for rest in _divisor_products(width - 1, smallest, high // divisor):
+            yield (divisor,) + rest
+
+
+@lru_cache(maxsize=None)
+def division_chains(width, low, high):
+    """Returns every valid division chain for a digit range, as columns.
+
+    A chain is a dividend in [2*low, high] followed by `width - 1` divisors in
+    [max(2, low), high] that each divide the running result cleanly. Rather than
+    searching for divisors of each dividend, chains are built from the multiples
+    side: every divisor tuple with product P pairs with each quotient q for which
+    q * P is a valid dividend. The index is built once per digit range and cached.
+    """
+    columns = [array("q") for _ in range(width)]
+    smallest = max(2, low)
+    for divisors in _divisor_products(width - 1, smallest, high):
+        product = reduce(mul, divisors, 1)
+        for quotient in range(max(1, -(-2 * low // product)), high // product + 1):
+            columns[0].append(quotient * product)
+            for column, divisor in zip(columns[1:], divisors):
+                column.append(divisor)
+    return columns
+
+
+def _division_rows(rng, count, width, low, high):
+    chains = division_chains(width, low, high) if high < 10**MAX_STANDARD_DIGITS else None
+    if chains and len(chains[0]):
+        # Sampling a chain index uniformly makes every valid chain equally likely
+        picks = uniform_ints(rng, count, 0, len(chains[0]) - 1)
+        columns = [list(map(column.__getitem__, picks)) for column in chains]
+    else:
+        # No chain fits in the digit range (e.g. 3 operands of 2 digits), or the range is
+        # too big to index, so build the dividend by multiplying a quotient by the divisors.
+        # The dividend is then larger than the digit range, but every (quotient, divisors)
+        # chain is equally likely and the cost does not depend on the number of digits.
+        divisors = [uniform_ints(rng, count, max(2, low), high) for _ in range(width - 1)]
+        quotients = uniform_ints(rng, count, low, high)
+        columns = [_fold(MUL, [quotients] + divisors)] + divisors
+    return columns, _fold(DIV, columns)
+
+
+def _rows_for(op, rng, count, width, low, high):
+    """Generates `count` questions using operator `op` only."""
+    if op == SUB:
+        return _subtraction_rows(rng, count, width, low, high)
+    if op == DIV:
+        return _division_rows(rng, count, width, low, high)
+    return _uniform_rows(op, rng, count, width, low, high)
+
+
+def _interleave(ops, per_op):
+    """Merges per-operator value lists back into question order."""
+    iters = [iter(values) if values is not None else None for values in per_op]
+    return list(map(next, map(iters.__getitem__, ops)))
+
+
+def generate_batch(settings, count, rng=random):
+    """Generates `count` questions for `settings` as a `QuestionBatch`.
+
+    Each question picks its operator uniformly from the enabled ones and
+    draws its operands uniformly from the digit range, like the game always
+    has. Questions are generated per operator in bulk and then merged back
+    into a random order. Mixed settings give an `ExpressionBatch` instead.
+    """
+    if settings.mixed:
+        return generate_expressions(settings, count, rng)
+    width = settings.operands
+    low, high = settings.digit_range()
+    ops = _draw_ops(rng, settings.op_codes(), count)
+
+    per_op_columns = [[None] * len(OPERATORS) for _ in range(width)]
+    per_op_answers = [None] * len(OPERATORS)
+    for op in set(ops):
+        columns, answers = _rows_for(op, rng, ops.count(op), width, low, high)
+        for j, column in enumerate(columns):
+            per_op_columns[j][op] = column
+        per_op_answers[op] = answers
+
+    columns = [_interleave(ops, per_op) for per_op in per_op_columns]
+    answers = _interleave(ops, per_op_answers)
+    return _packed_batch(settings, columns, ops, answers)
+
+
+def generate_op_batch(settings, op, count, rng=random):
+    """Generates `count` questions for `settings` that all use operator `op`.
+
+    With op MIXED the questions are mixed-operator expressions of the
+    operators `settings` enables.
+    """
+    if op == MIXED:
+        return generate_expressions(settings, count, rng)
+    low, high = settings.digit_range()
+    columns, answers = _rows_for(op, rng, count, settings.operands, low, high)
+    return _packed_batch(settings, columns, bytes([op]) * count, answers)
+
+
+def _packed_batch(settings, columns, ops, answers):
+    if settings.fits_int64():
+        columns = [array("q", column) for column in columns]
+        answers = array("q", answers)
+    # Otherwise (big numbers) keep plain lists so the values stay exact Python ints
+    return QuestionBatch(settings, columns, array("B", ops), answers)
+
+
+class Expression(namedtuple("Expression", "tree answer")):
+    """A mixed-operator question.
+
+    `tree` is a number or an (op, left, right) tuple. The text is rendered
+    from the tree on demand, with parentheses only where precedence needs them.
+    """
+    __slots__ = ()
+    op = MIXED
+
+    @property
+    def text(self):
+        return render(self.tree) + " = ?"
+
+    @property
+    def operands(self):
+        """The numbers in the expression, left to right."""
+        return tuple(_leaves(self.tree))
+
+
+def _leaves(node):
+    if type(node) is not tuple:
+        yield node
+    else:
+        yield from _leaves(node[1])
+        yield from _leaves(node[2])
+
+
+def render(node):
+    """Formats an expression tree, e.g. '12 + 3 × 4 - (8 - 2)'."""
+    if type(node) is not tuple:
+        return str(node)
+    op, left, right = node
+    precedence = _PRECEDENCE[op]
+    left_text, right_text = render(left), render(right)
+    if type(left) is tuple and _PRECEDENCE[left[0]] < precedence:
+        left_text = f"({left_text})"
+    if type(right) is tuple and (_PRECEDENCE[right[0]] < precedence
+                                 or (_PRECEDENCE[right[0]] == precedence and op in (SUB, DIV))):
+        right_text = f"({right_text})"
+    return f"{left_text} {OPERATORS[op]} {right_text}"
+
+
+def evaluate(node):
+    """Evaluates an expression tree.
+
+    Raises ValueError if any step has a negative or fractional result, which
+    no tree from `generate_expressions` does.
+    """
+    if type(node) is not tuple:
+        return node
+    op, left, right = node
+    a, b = evaluate(left), evaluate(right)
+    if op == DIV and (b == 0 or a % b):
+        raise ValueError(f"{render(node)} is not a whole number")
+    value = _FOLDS[op](a, b)
+    if value < 0:
+        raise ValueError(f"{render(node)} is negative")
+    return value
+
+
+class ExpressionBatch:
+    """A batch of mixed-operator questions, with the same interface as QuestionBatch."""
+
+    def __init__(self, settings, trees, answers, seed=None):
+        self.settings = settings
+        self.seed = seed
+        self.trees = trees
+        self.answers = answers
+
+    def __len__(self):
+        return len(self.trees)
+
+    def __getitem__(self, index):
+        return Expression(self.trees[index], self.answers[index])
+
+    def __iter__(self):
+        return map(Expression, self.trees, self.answers)
+
+    def text(self, index):
+        return self[index].text
+
+    def texts(self):
+        return [render(tree) + " = ?" for tree in self.trees]
+
+
+def _term(ops, words, low, high):
+    """Builds one run of × and ÷ (a term); returns (tree, value).
+
+    The first number and the divisors are picked together as a division
+    chain (see `division_chains`), so every division in the run comes out
+    even whatever is multiplied in between.
+    """
+    span = high - low + 1
+    divisions = ops.count(DIV)
+    if divisions:
+        chains = division_chains(divisions + 1, low, high) if high < 10**MAX_STANDARD_DIGITS else None
+        if chains and len(chains[0]):
+            pick = next(words) % len(chains[0])
+            value = chains[0][pick]
+            divisors = [column[pick] for column in chains[:0:-1]] # Reversed, popped in order below
+        else:
+            # As in _division_rows: the first number is the quotient times the divisors
+            divisors = [max(2, low) + next(words) % (high - max(2, low) + 1) for _ in range(divisions)]
+            value = reduce(mul, divisors, low + next(words) % span)
+    else:
+        value = low + next(words) % span
+    tree = value
+    for op in ops:
+        if op == MUL:
+            number = low + next(words) % span
+            value *= number
+        else:
+            number = divisors.pop()
+            value //= number
+        tree = (op, tree, number)
+    return tree, value
+
+
+def generate_expressions(settings, count, rng=random):
+    """Generates `count` mixed-operator questions for `settings` as an `ExpressionBatch`.
+
+    The operator between each pair of numbers is drawn uniformly from the
+    enabled ones. × and ÷ bind tighter, so the expression is a sum of terms,
+    each a run of × and ÷ built by `_term`. Terms are then added or
+    subtracted left to right; when a term is bigger than everything before it
+    the subtraction is turned around (`term - (...)`), so every intermediate
+    result is a non-negative whole number without ever drawing again.
+    """
+    width = settings.operands
+    low, high = settings.digit_range()
+    codes = settings.op_codes()
+    # Enough random words for the operators and every number, plus one per division
+    words = iter(_random_words(rng, count * 3 * width))
+    trees = []
+    answers = []
+    for _ in range(count):
+        ops = [codes[next(words) % len(codes)] for _ in range(width - 1)]
+        tree = value = None
+        sign = ADD
+        term_ops = []
+        for op in ops + [ADD]: # The extra ADD closes the last term
+            if op == MUL or op == DIV:
+                term_ops.append(op)
+                continue
+            term, term_value = _term(term_ops, words, low, high)
+            if tree is None:
+                tree, value = term, term_value
+            elif sign == ADD:
+                tree, value = (ADD, tree, term), value + term_value
+            elif term_value <= value:
+                tree, value = (SUB, tree, term), value - term_value
+            else:
+                tree, value = (SUB, term, tree), term_value - value
+            sign = op
+            term_ops = []
+        trees.append(tree)
+        answers.append(value)
+    if settings.fits_int64():
+        answers = array("q", answers)
+    return ExpressionBatch(settings, trees, answers)
+
+
+def batch_from_questions(settings, questions, seed=None):
+    """Builds a batch for `settings` out of individual questions."""
+    questions = list(questions)
+    answers = [question.answer for question in questions]
+    if settings.fits_int64():
+        answers = array("q", answers)
+    if settings.mixed:
+        return ExpressionBatch(settings, [question.tree for question in questions], answers, seed)
+    columns = [list(column) for column in zip(*(question.operands for question in questions))]
+    if settings.fits_int64():
+        columns = [array("q", column) for column in columns]
+    return QuestionBatch(settings, columns, array("B", (question.op for question in questions)), answers, seed)
+
+
+def seeded_batch(settings, count, seed):
+    """Generates the question set identified by `seed` and `settings`.
+
+    The same seed and settings always give the same questions, so a set can be
+    replayed or handed out to a whole class by its number.
+    """
+    batch = generate_batch(settings, count, random.Random(seed))
+    batch.seed = seed
+    return batch
+
+
+def new_seed():
+    """Picks a fresh set number for an unseeded game."""
+    return random.getrandbits(32)
+
+
+def question_stream(settings, rng=random, chunk_size=32):
+    """Yields questions for `settings` forever, for sessions with no fixed length.
+
+    Questions are generated `chunk_size` at a time, so memory stays constant
+    however long the session runs and each question costs microseconds.
+    """
+    while True:
+        yield from generate_batch(settings, chunk_size, rng)
+
+
+def answer_stream(settings, rng=random, chunk_size=32):
+    """The answers of question_stream(settings, rng, chunk_size), without building the questions."""
+    while True:
+        yield from generate_batch(settings, chunk_size, rng).answers
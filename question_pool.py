@@ -0,0 +1,109 @@
+"""Background prefetching of question batches for Quick Math Challenge.
+
+Generating a batch is quick, but it still used to happen on the Tk main
+thread when "Start Game" was pressed. The pool keeps a few ready batches
+per game settings tuple and refills them in a worker thread while the
+current game is being played.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from question_engine import seeded_batch, new_seed
+
+
+class QuestionPool:
+    """Keeps ready-made question batches, keyed by GameSettings.
+
+    Every batch is seeded with a fresh set number, so any game played from
+    the pool can be replayed later.
+
+    At most `depth` batches are kept per settings tuple, and at most
+    `max_settings` settings tuples are kept at all; the least recently used
+    settings are evicted first, so memory stays bounded.
+    """
+
+    def __init__(self, batch_size, depth=2, max_settings=8):
+        self.batch_size = batch_size
+        self.depth = depth
+        self.max_settings = max_settings
+        self.hits = 0
+        self.misses = 0
+        self._ready = OrderedDict() # settings -> deque of batches, least recently used first
+        self._wanted = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="QuestionPool", daemon=True)
+        self._worker.start()
+
+    def get(self, settings):
+        """Returns a batch for `settings`, generating one right away on a miss."""
+        batch = self.get_nowait(settings)
+        if batch is None:
+            batch = self.generate(settings)
+        return batch
+
+    def generate(self, settings):
+        """Returns a new batch for `settings`, made right away without touching the ready ones.
+
+        For callers that already had their miss counted by get_nowait().
+        """
+        return seeded_batch(settings, self.batch_size, new_seed())
+
+    def get_nowait(self, settings):
+        """Returns a ready batch for `settings`, or None if there isn't one yet."""
+        with self._cond:
+            batches = self._ready.get(settings)
+            batch = batches.popleft() if batches else None
+            if batch is not None:
+                self.hits += 1
+                self._ready.move_to_end(settings)
+            else:
+                self.misses += 1
+        self.prefetch(settings) # Refill while this batch is being played
+        return batch
+
+    def prefetch(self, settings):
+        """Asks the worker to fill up the batches for `settings`."""
+        with self._cond:
+            self._ready.setdefault(settings, deque())
+            self._ready.move_to_end(settings)
+            self._evict()
+            if settings not in self._wanted:
+                self._wanted.append(settings)
+            self._cond.notify()
+
+    def stats(self):
+        """Returns the hit/miss counters and how many batches are ready."""
+        with self._cond:
+            ready = sum(len(batches) for batches in self._ready.values())
+            return {"hits": self.hits, "misses": self.misses, "ready": ready}
+
+    def close(self):
+        """Stops the worker thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._worker.join()
+
+    def _evict(self):
+        while len(self._ready) > self.max_settings:
+            self._ready.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._wanted and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                settings = self._wanted[0]
+                batches = self._ready.get(settings)
+                if batches is None or len(batches) >= self.depth:
+                    # Full, or evicted while waiting
+                    self._wanted.popleft()
+                    continue
+            batch = seeded_batch(settings, self.batch_size, new_seed()) # Outside the lock
+            with self._cond:
+                batches = self._ready.get(settings)
+                if batches is not None and len(batches) < self.depth:
+                    batches.append(batch)
@@ -0,0 +1,159 @@
+"""Compact binary files of seeded question sets.
+
+A question set file holds many sets generated with `seeded_batch`, one per
+consecutive set number (seed). Every set takes the same number of bytes, so
+set #N can be read straight out of a memory map without parsing the rest of
+the file.
+
+Layout (little-endian):
+    header:  magic b"MQS1", operands (u8), digits (u8), flags (u8: 1 = +-,
+             2 = ×÷), value size in bytes (u8), questions per set (u32),
+             number of sets (u64), first set number (u64)
+    records: per set, the operator codes (1 byte each), then each operand
+             column, then the answers, each value a signed fixed-width int
+
+Usage:
+    python question_sets.py build sets.mqs --sets 1000000 --operands 2 --digits 2 --ops +-
+    python question_sets.py show sets.mqs 42
+"""
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+from atomic_file import atomic_open
+from question_engine import (GameSettings, QuestionBatch, NUM_QUESTIONS, seeded_batch,
+                             settings_from_ops)
+
+MAGIC = b"MQS1"
+_HEADER = struct.Struct("<4sBBBBIQQ")
+
+
+def value_size(settings):
+    """Bytes needed to store any operand or answer for `settings`."""
+    if settings.fits_int64():
+        return 8
+    high = settings.digit_range()[1]
+    return (high ** settings.operands).bit_length() // 8 + 1 # +1 leaves room for the sign
+
+
+def _pack_values(values, size):
+    if size == 8:
+        packed = array("q", values)
+        if sys.byteorder == "big":
+            packed.byteswap()
+        return packed.tobytes()
+    return b"".join(value.to_bytes(size, "little", signed=True) for value in values)
+
+
+def _unpack_values(buffer, size):
+    if size == 8:
+        values = array("q")
+        values.frombytes(buffer)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+    return [int.from_bytes(buffer[i:i + size], "little", signed=True)
+            for i in range(0, len(buffer), size)]
+
+
+def write_question_sets(path, settings, count, questions_per_set=NUM_QUESTIONS, first_seed=0):
+    """Writes sets `first_seed` .. `first_seed + count - 1` for `settings` to `path`."""
+    if settings.mixed:
+        raise ValueError("Mixed-operator sets have no fixed layout; regenerate them from their set numbers")
+    size = value_size(settings)
+    flags = (1 if settings.add_sub else 0) | (2 if settings.mul_div else 0)
+    with atomic_open(path, "wb", buffering=1 << 20) as f:
+        f.write(_HEADER.pack(MAGIC, settings.operands, settings.digits, flags, size,
+                             questions_per_set, count, first_seed))
+        for seed in range(first_seed, first_seed + count):
+            batch = seeded_batch(settings, questions_per_set, seed)
+            f.write(batch.ops.tobytes())
+            for column in batch.columns:
+                f.write(_pack_values(column, size))
+            f.write(_pack_values(batch.answers, size))
+
+
+class QuestionSetFile:
+    """Read-only, memory-mapped access to a question set file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, operands, digits, flags, size, per_set, count, first_seed = \
+            _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a question set file")
+        self.settings = GameSettings(operands, digits, bool(flags & 1), bool(flags & 2))
+        self.value_size = size
+        self.questions_per_set = per_set
+        self.first_seed = first_seed
+        self._count = count
+        self._record_size = per_set * (1 + (operands + 1) * size)
+
+    def __len__(self):
+        return self._count
+
+    def set_numbers(self):
+        """The set numbers (seeds) stored in the file."""
+        return range(self.first_seed, self.first_seed + self._count)
+
+    def get(self, seed):
+        """Returns set number `seed` as a QuestionBatch."""
+        index = seed - self.first_seed
+        if not 0 <= index < self._count:
+            raise KeyError(f"Set #{seed} is not in this file")
+        view = memoryview(self._map)
+        start = _HEADER.size + index * self._record_size
+        per_set, size = self.questions_per_set, self.value_size
+        ops = array("B", view[start:start + per_set])
+        start += per_set
+        values = []
+        for _ in range(self.settings.operands + 1):
+            values.append(_unpack_values(view[start:start + per_set * size], size))
+            start += per_set * size
+        view.release()
+        return QuestionBatch(self.settings, values[:-1], ops, values[-1], seed)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect question set files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="write seeded question sets to a file")
+    build.add_argument("path")
+    build.add_argument("--sets", type=int, required=True, help="number of sets to write")
+    build.add_argument("--first-seed", type=int, default=0, help="number of the first set")
+    build.add_argument("--questions", type=int, default=NUM_QUESTIONS, help="questions per set")
+    build.add_argument("--operands", type=int, default=2)
+    build.add_argument("--digits", type=int, default=2)
+    build.add_argument("--ops", default="+-", help="'+-', '×÷' (or '*/') or both")
+
+    show = commands.add_parser("show", help="print one set from a file")
+    show.add_argument("path")
+    show.add_argument("set_number", type=int)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        settings = settings_from_ops(args.operands, args.digits, args.ops)
+        write_question_sets(args.path, settings, args.sets, args.questions, args.first_seed)
+    else:
+        with QuestionSetFile(args.path) as sets:
+            print(f"Set #{args.set_number} ({sets.settings.label()})")
+            for question in sets.get(args.set_number):
+                print(f"{question.text.replace('?', str(question.answer))}")
+
+
+if __name__ == "__main__":
+    main()
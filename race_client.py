@@ -0,0 +1,91 @@
+"""Client side of the race protocol, used by the game's network mode.
+
+Messages are JSON objects, one per line, in both directions.
+
+Client to server:
+    {"type": "join", "name": ..., "room": ...}
+    {"type": "answer", "text": ...}        answer to the current question
+
+Server to client:
+    {"type": "waiting", "players": n, "starts_in": seconds or null}
+    {"type": "start", "seed": ..., "settings": [operands, digits, add_sub, mul_div, mixed],
+     "questions": n}                        clients rebuild the set with seeded_batch
+    {"type": "result", "status": ..., "index": i}   a grade_answer result
+    {"type": "standings", "leaders": [[name, solved, time or null], ...], "players": n}
+    {"type": "finished", "time": seconds, "place": n}
+    {"type": "race_over", "leaders": [...]}
+"""
+import json
+import queue
+import socket
+import threading
+
+DEFAULT_PORT = 8765
+DEFAULT_ROOM = "lobby"
+
+
+def encode_message(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def parse_address(address):
+    """Splits 'host:port/room' (port and room optional) into (host, port, room)."""
+    address, _, room = address.partition("/")
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or "localhost", int(port) if port else DEFAULT_PORT, room or DEFAULT_ROOM
+
+
+def raise_open_file_limit(wanted):
+    """Raises the open file limit towards `wanted`, for thousands of sockets."""
+    try:
+        import resource
+    except ImportError: # Not on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY:
+        wanted = min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+        except (ValueError, OSError):
+            pass
+
+
+class RaceClient:
+    """A blocking connection to a race server.
+
+    A reader thread puts every message from the server on `messages`, ending
+    with {"type": "closed"} when the connection goes away, so a GUI can poll
+    the queue without ever blocking on the network.
+    """
+
+    def __init__(self, host, port, name, room=DEFAULT_ROOM, timeout=5):
+        self.messages = queue.Queue()
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.settimeout(None)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send({"type": "join", "name": name, "room": room})
+        self._reader = threading.Thread(target=self._read_loop, name="RaceClient", daemon=True)
+        self._reader.start()
+
+    def send(self, message):
+        self._sock.sendall(encode_message(message))
+
+    def send_answer(self, text):
+        self.send({"type": "answer", "text": text})
+
+    def _read_loop(self):
+        try:
+            with self._sock.makefile("rb") as stream:
+                for line in stream:
+                    self.messages.put(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        self.messages.put({"type": "closed"})
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
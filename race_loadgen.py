@@ -0,0 +1,124 @@
+"""Load generator for the race server.
+
+Opens many simulated players against a running race server, plays one race
+with all of them and reports how the server kept up: answer round-trip
+latency, answers per second and how many players finished.
+
+Usage:
+    python race_server.py --port 8765 --start-delay 15 &
+    python race_loadgen.py --clients 5000 --port 8765
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from question_engine import GameSettings, seeded_batch
+from race_client import DEFAULT_PORT, encode_message, raise_open_file_limit
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.finished = 0
+        self.answers = 0
+        self.latencies = []
+        self.first_start = None
+        self.last_finish = None
+
+
+async def play(number, args, stats, batches, connect_slots):
+    async with connect_slots: # Don't flood the listen backlog
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    stats.connected += 1
+    writer.write(encode_message({"type": "join", "name": f"bot{number}", "room": args.room}))
+    batch = None
+    index = 0
+    sent_at = 0.0
+    rng = random.Random(number)
+
+    async def answer():
+        nonlocal sent_at
+        if args.think:
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+        correct = batch.answers[index]
+        text = str(correct + 1 if rng.random() < args.error_rate else correct)
+        sent_at = time.perf_counter()
+        writer.write(encode_message({"type": "answer", "text": text}))
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            kind = message["type"]
+            if kind == "start":
+                key = (message["seed"], tuple(message["settings"]), message["questions"])
+                if key not in batches: # Every bot gets the same set; build it once
+                    batches[key] = seeded_batch(GameSettings(*message["settings"]),
+                                                message["questions"], message["seed"])
+                batch = batches[key]
+                index = 0
+                stats.first_start = stats.first_start or time.perf_counter()
+                await answer()
+            elif kind == "result":
+                stats.latencies.append(time.perf_counter() - sent_at)
+                stats.answers += 1
+                if message["status"] == "correct":
+                    index += 1
+                if index < len(batch):
+                    await answer()
+            elif kind == "finished":
+                stats.finished += 1
+                stats.last_finish = time.perf_counter()
+                break
+    finally:
+        writer.close()
+
+
+async def run(args):
+    stats = Stats()
+    batches = {}
+    connect_slots = asyncio.Semaphore(args.connect_concurrency)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(play(n, args, stats, batches, connect_slots)
+                                     for n in range(args.clients)), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    elapsed = time.perf_counter() - started
+
+    print(f"clients:   {args.clients} ({stats.connected} connected, {len(errors)} errors)")
+    if errors:
+        print(f"  first error: {errors[0]!r}")
+    print(f"finished:  {stats.finished}")
+    if stats.latencies:
+        latencies = sorted(stats.latencies)
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        race_time = (stats.last_finish or time.perf_counter()) - stats.first_start
+        print(f"answers:   {stats.answers} in {race_time:.2f}s of racing "
+              f"({stats.answers / race_time:.0f}/s)")
+        print(f"latency:   p50 {pct(0.50):.2f} ms, p99 {pct(0.99):.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    print(f"total:     {elapsed:.2f}s including connecting and the start countdown")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate players against a race server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--room", default="loadtest")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="mean seconds a bot thinks before each answer")
+    parser.add_argument("--error-rate", type=float, default=0.1,
+                        help="chance that an answer is wrong")
+    parser.add_argument("--connect-concurrency", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    raise_open_file_limit(args.clients + 64) # Each bot needs a socket
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Asyncio server for head-to-head and classroom races.
+
+Everyone in a room gets the same seeded question set and races on time.
+Answers are checked on the server with the same rules as the game
+(`grade_answer`), the server keeps each player's progress and time, and
+the standings are broadcast a few times a second.
+
+A race starts `--start-delay` seconds after the first player joins a room;
+players joining during a race wait for the next one. See race_client.py
+for the message format.
+
+Usage:
+    python race_server.py --port 8765 --operands 2 --digits 2 --ops +-
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import time
+
+from question_engine import (NUM_QUESTIONS, ANSWER_CORRECT, grade_answer, seeded_batch, new_seed,
+                             settings_from_ops)
+from race_client import DEFAULT_PORT, DEFAULT_ROOM, encode_message, raise_open_file_limit
+
+MAX_LINE = 4096 # Longest message a client may send
+MAX_BUFFERED = 256 * 1024 # Drop clients that stop reading
+STANDINGS_SIZE = 10
+WAITING, COUNTDOWN, RUNNING = "waiting", "countdown", "running"
+
+
+class Player:
+    __slots__ = ("name", "writer", "racing", "index", "finish_time")
+
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.racing = False
+        self.index = 0 # Questions solved in the current race
+        self.finish_time = None
+
+
+class Room:
+    """Players who race each other, and the state of their current race."""
+
+    def __init__(self, server, name):
+        self.server = server
+        self.name = name
+        self.players = set()
+        self.state = WAITING
+        self.batch = None
+        self.started_at = 0.0
+        self.finished = 0
+        self.dirty = False # Standings changed since the last broadcast
+        self._timer = None
+        self._countdown_ends = 0.0
+
+    def send(self, player, message):
+        self.server.send(player, encode_message(message))
+
+    def broadcast(self, message, racing_only=False):
+        data = encode_message(message)
+        for player in list(self.players):
+            if player.racing or not racing_only:
+                self.server.send(player, data)
+
+    def join(self, player):
+        self.players.add(player)
+        if self.state == WAITING:
+            self.state = COUNTDOWN
+            self._timer = asyncio.get_running_loop().call_later(self.server.start_delay, self.start_race)
+            self._countdown_ends = time.monotonic() + self.server.start_delay
+        starts_in = None
+        if self.state == COUNTDOWN:
+            starts_in = round(self._countdown_ends - time.monotonic(), 1)
+        self.send(player, {"type": "waiting", "players": len(self.players), "starts_in": starts_in})
+
+    def leave(self, player):
+        self.players.discard(player)
+        if player.racing and player.finish_time is None:
+            player.racing = False
+            self.dirty = True
+            self._check_race_over()
+        if not self.players:
+            if self._timer is not None:
+                self._timer.cancel()
+            self.server.rooms.pop(self.name, None)
+
+    def start_race(self):
+        settings = self.server.settings
+        self.batch = seeded_batch(settings, self.server.questions, new_seed())
+        self.state = RUNNING
+        self.finished = 0
+        self.started_at = time.monotonic()
+        for player in self.players:
+            player.racing = True
+            player.index = 0
+            player.finish_time = None
+        self.broadcast({"type": "start", "seed": self.batch.seed, "settings": list(settings),
+                        "questions": len(self.batch)})
+        self.dirty = True
+        self._timer = asyncio.get_running_loop().call_later(self.server.race_seconds, self.end_race)
+
+    def answer(self, player, text):
+        if self.state != RUNNING or not player.racing or player.finish_time is not None:
+            return
+        status = grade_answer(text, self.batch.answers[player.index])
+        self.send(player, {"type": "result", "status": status, "index": player.index})
+        if status != ANSWER_CORRECT:
+            return
+        player.index += 1
+        self.dirty = True
+        if player.index == len(self.batch):
+            player.finish_time = time.monotonic() - self.started_at
+            self.finished += 1
+            self.send(player, {"type": "finished", "time": player.finish_time, "place": self.finished})
+            self._check_race_over()
+
+    def _check_race_over(self):
+        if self.state == RUNNING and all(p.finish_time is not None for p in self.players if p.racing):
+            self._timer.cancel()
+            self.end_race()
+
+    def end_race(self):
+        self.broadcast({"type": "race_over", "leaders": self.leaders()})
+        self.state = WAITING
+        for player in self.players:
+            player.racing = False
+        if self.players: # Next race for everyone still here
+            self.state = COUNTDOWN
+            self._countdown_ends = time.monotonic() + self.server.start_delay
+            self._timer = asyncio.get_running_loop().call_later(self.server.start_delay, self.start_race)
+            self.broadcast({"type": "waiting", "players": len(self.players),
+                            "starts_in": self.server.start_delay})
+
+    def leaders(self):
+        """Top players: finished ones by time, then the others by questions solved."""
+        racing = (p for p in self.players if p.racing or p.finish_time is not None)
+        top = heapq.nsmallest(STANDINGS_SIZE, racing, key=lambda p: (
+            p.finish_time is None, p.finish_time or 0.0, -p.index))
+        return [[p.name, p.index, p.finish_time] for p in top]
+
+    def broadcast_standings(self):
+        self.dirty = False
+        racing = sum(1 for p in self.players if p.racing)
+        self.broadcast({"type": "standings", "leaders": self.leaders(), "players": racing},
+                       racing_only=True)
+
+
+class RaceServer:
+    def __init__(self, settings, questions=NUM_QUESTIONS, start_delay=5.0, race_seconds=300.0,
+                 standings_interval=0.5):
+        self.settings = settings
+        self.questions = questions
+        self.start_delay = start_delay
+        self.race_seconds = race_seconds
+        self.standings_interval = standings_interval
+        self.rooms = {}
+        self.connections = 0
+
+    def send(self, player, data):
+        transport = player.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_BUFFERED:
+            transport.abort() # Too slow to keep up; its handler cleans up
+            return
+        player.writer.write(data)
+
+    async def handle_client(self, reader, writer):
+        self.connections += 1
+        player = room = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                kind = message.get("type")
+                if kind == "answer" and room is not None:
+                    room.answer(player, str(message.get("text", "")))
+                elif kind == "join" and room is None:
+                    name = str(message.get("name") or "Anonymous")[:12]
+                    room_name = str(message.get("room") or DEFAULT_ROOM)[:32]
+                    room = self.rooms.get(room_name)
+                    if room is None:
+                        room = self.rooms[room_name] = Room(self, room_name)
+                    player = Player(name, writer)
+                    room.join(player)
+        except (ConnectionError, ValueError, AttributeError, asyncio.LimitOverrunError):
+            pass # Disconnected, or sent something that isn't a message
+        finally:
+            self.connections -= 1
+            if room is not None:
+                room.leave(player)
+            writer.close()
+
+    async def broadcast_standings(self):
+        while True:
+            await asyncio.sleep(self.standings_interval)
+            for room in list(self.rooms.values()):
+                if room.state == RUNNING and room.dirty:
+                    room.broadcast_standings()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port,
+                                            limit=MAX_LINE, backlog=4096)
+        print(f"Race server on {host}:{port} ({self.settings.label()}, {self.questions} questions)")
+        async with server:
+            standings = asyncio.ensure_future(self.broadcast_standings())
+            try:
+                await server.serve_forever()
+            finally:
+                standings.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Quick Math Challenge race server.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--operands", type=int, default=2)
+    parser.add_argument("--digits", type=int, default=2)
+    parser.add_argument("--ops", default="+-", help="'+-', '×÷' (or '*/') or both")
+    parser.add_argument("--mixed", action="store_true", help="mix the operators within each question")
+    parser.add_argument("--questions", type=int, default=NUM_QUESTIONS)
+    parser.add_argument("--start-delay", type=float, default=5.0,
+                        help="seconds between the first player joining and the race starting")
+    parser.add_argument("--race-seconds", type=float, default=300.0, help="time limit of a race")
+    args = parser.parse_args(argv)
+
+    settings = settings_from_ops(args.operands, args.digits, args.ops, args.mixed)
+    server = RaceServer(settings, args.questions, args.start_delay, args.race_seconds)
+    raise_open_file_limit(65536) # One socket per player
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
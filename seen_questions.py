@@ -0,0 +1,266 @@
+"""Per-player memory of the questions already played, so games don't repeat them.
+
+Every question dealt to a player is added to a Bloom filter keyed by the
+question's canonical form (operands in order, or sorted for + and ×, so
+3 + 4 and 4 + 3 count as the same question). Checking or adding a question
+hashes it once and touches a fixed number of bits, however many questions
+have been played.
+
+A filter generation holds up to CAPACITY questions at a false positive rate
+of FALSE_POSITIVE_RATE. When it is full it becomes the previous generation
+and a new one is started, so the last CAPACITY to 2 * CAPACITY questions are
+remembered in bounded memory (about 600 KB per player).
+
+A false positive only means an unplayed question is skipped. When the
+settings have few questions left to give (e.g. 2 operands of 1 digit), up to
+MAX_SKIPS seen questions in a row are skipped before repeats are allowed
+again, and `exhausted` is set so the game can say so.
+
+Filters are saved per player in SEEN_DIR:
+    header:  magic b"MSQ1", then per generation (previous, current):
+             number of bits (u64), number of hashes (u8), questions (u64)
+    body:    the previous generation's bits, then the current one's
+"""
+import hashlib
+import math
+import os
+import random
+import re
+import struct
+from itertools import chain, islice
+
+from atomic_file import atomic_open
+from question_engine import (ADD, MUL, MIXED, OP_NAMES, batch_from_questions, question_stream, render,
+                             seeded_batch)
+
+SEEN_DIR = "math_game_seen"
+CAPACITY = 250_000
+FALSE_POSITIVE_RATE = 0.01
+MAX_SKIPS = 50
+
+MAGIC = b"MSQ1"
+_GENERATION = struct.Struct("<QBQ")
+
+
+def canonical_key(question):
+    """The bytes that identify a question, whichever way round it was written."""
+    op = question.op
+    if op == MIXED:
+        return render(question.tree).encode()
+    operands = sorted(question.operands) if op == ADD or op == MUL else question.operands
+    return f"{OP_NAMES[op]}{operands}".encode()
+
+
+def player_file(name, directory, extension):
+    """The file in `directory` that holds a player's `extension` data, e.g. 'ana.seen'.
+
+    Names are cut to 12 characters as on the leaderboard, so the game and
+    terminal_game share a player's files however long a name is typed.
+    """
+    slug = re.sub(r"[^\w-]", "_", name.strip()[:12].casefold()) or "_"
+    return os.path.join(directory, slug + extension)
+
+
+def candidates(settings, count, seed, batch=None):
+    """The questions `fresh_batch` picks from: set `seed`, then a stream seeded the same way."""
+    if batch is None:
+        batch = seeded_batch(settings, count, seed)
+    return chain(batch, question_stream(settings, random.Random(seed)))
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of byte strings."""
+
+    def __init__(self, capacity=CAPACITY, error_rate=FALSE_POSITIVE_RATE, num_bits=None, num_hashes=None,
+                 bits=None, count=0):
+        if num_bits is None:
+            num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((num_bits + 7) // 8) if bits is None else bits
+        self.count = count # Keys added (false positives on add aren't counted)
+
+    def positions(self, key):
+        """The bits of `key`; filters of the same size share them."""
+        # Double hashing: k positions from the two halves of one 64-bit digest
+        digest = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        first, step = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        num_bits = self.num_bits
+        return [(first + i * step) % num_bits for i in range(self.num_hashes)]
+
+    def same_size(self, other):
+        return self.num_bits == other.num_bits and self.num_hashes == other.num_hashes
+
+    def __contains__(self, key):
+        return self.has(self.positions(key))
+
+    def has(self, positions):
+        bits = self.bits
+        for position in positions:
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        """Adds `key`; returns False if it (probably) was already there."""
+        return self.set(self.positions(key))
+
+    def set(self, positions):
+        """Sets the bits of a key; returns False if they all were already set."""
+        bits = self.bits
+        new = False
+        for position in positions:
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        self.count += new
+        return new
+
+
+class SeenQuestions:
+    """The questions one player has been dealt, as two Bloom filter generations."""
+
+    def __init__(self, path=None, capacity=CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.previous = None
+        self.current = BloomFilter(capacity)
+        self.exhausted = False # The last fresh() had to allow repeats
+        self.skipped = 0 # Seen questions skipped by the last fresh()
+        self.skip_runs = [] # (first position, count) of each run of questions the last fresh() skipped
+        self.dealt = 0 # Questions the last fresh() yielded
+
+    @staticmethod
+    def for_player_path(name, directory=SEEN_DIR):
+        """The file a player's filter is saved in."""
+        return player_file(name, directory, ".seen")
+
+    @classmethod
+    def for_player(cls, name, directory=SEEN_DIR):
+        """Loads the player's filter, or starts an empty one."""
+        seen = cls(cls.for_player_path(name, directory))
+        try:
+            seen.load()
+        except FileNotFoundError:
+            pass
+        return seen
+
+    def __contains__(self, question):
+        key = canonical_key(question)
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def __len__(self):
+        return self.current.count + (self.previous.count if self.previous is not None else 0)
+
+    def add(self, question):
+        """Marks a question as played; returns False if it was already seen."""
+        key = canonical_key(question)
+        positions = self.current.positions(key)
+        previous = self.previous
+        if previous is not None and previous.has(positions if previous.same_size(self.current)
+                                                 else previous.positions(key)):
+            return False
+        if not self.current.set(positions):
+            return False
+        if self.current.count >= self.capacity:
+            self.previous, self.current = self.current, BloomFilter(self.capacity)
+        return True
+
+    def fresh(self, questions, max_skips=MAX_SKIPS):
+        """Yields the questions not seen yet, marking each one as seen.
+
+        After `max_skips` seen questions in a row the next question is used
+        anyway and `exhausted` is set.
+        """
+        self.exhausted = False
+        self.skipped = 0
+        self.skip_runs = []
+        self.dealt = 0
+        return self._fresh(questions, max_skips)
+
+    @property
+    def picks(self):
+        """Positions of the questions the last fresh() yielded, for replays.
+
+        Only the runs of skipped questions are kept while questions are
+        dealt, so an endless or sprint stream doesn't grow a list of every
+        position played; this list is built once, when the game is saved.
+        """
+        picks = []
+        position = 0
+        for first, count in self.skip_runs:
+            picks.extend(range(position, first))
+            position = first + count
+        picks.extend(range(position, position + self.dealt - len(picks)))
+        return picks
+
+    def _fresh(self, questions, max_skips):
+        run = 0
+        for position, question in enumerate(questions):
+            if not self.add(question):
+                if run < max_skips:
+                    run += 1
+                    self.skipped += 1
+                    continue
+                self.exhausted = True # Deal it anyway
+            if run:
+                self.skip_runs.append((position - run, run))
+                run = 0
+            self.dealt += 1
+            yield question
+
+    def fresh_batch(self, batch):
+        """Returns `batch` with the questions already seen replaced by new ones.
+
+        The replacements come from a stream seeded by the batch's set number
+        (see `candidates`). A batch that needed no replacements is returned as
+        it is, so its set number still replays it; otherwise the new batch has
+        no set number, and `picks` says which candidates it was made of.
+        """
+        questions = list(islice(self.fresh(candidates(batch.settings, len(batch), batch.seed,
+                                                      batch)), len(batch)))
+        if not self.skipped:
+            return batch
+        return batch_from_questions(batch.settings, questions)
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a seen questions file")
+        offset = len(MAGIC)
+        headers = []
+        for _ in range(2):
+            headers.append(_GENERATION.unpack_from(data, offset))
+            offset += _GENERATION.size
+        generations = []
+        for num_bits, num_hashes, count in headers:
+            size = (num_bits + 7) // 8
+            if not num_bits:
+                generations.append(None)
+                continue
+            bits = bytearray(data[offset:offset + size])
+            if len(bits) != size:
+                raise ValueError(f"{path} is truncated")
+            generations.append(BloomFilter(num_bits=num_bits, num_hashes=num_hashes, bits=bits, count=count))
+            offset += size
+        self.previous, self.current = generations[0], generations[1] or BloomFilter(self.capacity)
+
+    def save(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with atomic_open(path, "wb") as f:
+            f.write(MAGIC)
+            for generation in (self.previous, self.current):
+                if generation is None:
+                    f.write(_GENERATION.pack(0, 0, 0))
+                else:
+                    f.write(_GENERATION.pack(generation.num_bits, generation.num_hashes, generation.count))
+            for generation in (self.previous, self.current):
+                if generation is not None:
+                    f.write(generation.bits)
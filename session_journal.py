@@ -0,0 +1,337 @@
+"""Append-only journal of every game played, for verifying leaderboard scores.
+
+While a game is played, `SessionJournal` packs each event (question shown,
+keystroke, answer submitted, and the answer's result) into an in-memory
+buffer, a few hundred nanoseconds each. When the game ends the whole game
+becomes one record, appended to JOURNAL_FILE in a single write. The
+leaderboard stores the record's session id with the score.
+
+`verify` replays a record against the seeded question set it names:
+every submitted answer is graded again, and the score is recomputed from
+the event times the same way the game computes it. The verifier checks
+thousands of games per second, so the whole board can be audited:
+
+    python session_journal.py verify
+    python session_journal.py verify math_game_journal.bin --db math_game_leaderboard.db --list
+
+Record layout (little-endian):
+    magic b"MQJ1", body length (u32), body, crc32 of the body (u32)
+    body:    session id (u64), created (f64, epoch seconds), mode (u8),
+             operands (u8), digits (u8), flags (u8: 1 = +-, 2 = ×÷, 4 = mixed,
+             8 = adaptive),
+             set number (u64), questions (u16, 0 = until time or a mistake
+             ends the game), picks (u32), then one u32 per pick: the
+             positions of the questions played among the candidates
+             (see seen_questions.candidates), when it skipped any
+    events:  kind (u8), microseconds since the previous event (u32), then
+             for SUBMIT the typed text (u8 length + UTF-8), for RESULT the
+             result code (u8), and for SHOWN in adaptive games the question's
+             cell (u8, see player_stats)
+
+A journal can only show that a score is consistent with a real game of the
+set it names; it is not signed, so it can't stop someone forging a whole
+consistent game.
+"""
+import mmap
+import random
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple
+from itertools import chain, islice
+
+from question_engine import (ANSWER_CORRECT, ANSWER_WRONG, ANSWER_EMPTY, ANSWER_INVALID,
+                             MODE_CLASSIC, MODE_SPRINT, MODE_ENDLESS, GameSettings, answer_stream,
+                             grade_answer, seeded_batch)
+
+JOURNAL_FILE = "math_game_journal.bin"
+MAX_SEED = (1 << 64) - 1 # Largest set number a journal can name
+SCORE_TOLERANCE = 0.005 # Seconds a replayed score may differ from the leaderboard's
+
+MAGIC = b"MQJ1"
+MODES = (MODE_CLASSIC, MODE_SPRINT, MODE_ENDLESS)
+RESULTS = (ANSWER_CORRECT, ANSWER_WRONG, ANSWER_EMPTY, ANSWER_INVALID)
+SHOWN, KEY, SUBMIT, RESULT, END = range(1, 6)
+
+_FRAME = struct.Struct("<4sI")
+_HEADER = struct.Struct("<QdBBBBQHI")
+_EVENT = struct.Struct("<BI")
+_CRC = struct.Struct("<I")
+_MAX_DELTA = 0xFFFFFFFF
+
+Verdict = namedtuple("Verdict", "session ok reason settings mode seed score correct created adaptive")
+
+
+class SessionJournal:
+    """Records one game at a time: call `begin`, the event methods, then `finish`."""
+
+    def __init__(self):
+        self.session = None
+        self.created = 0.0
+        self._events = bytearray()
+        self._last_ns = 0
+
+    def begin(self, session=None):
+        """Starts recording a new game, with a new random session id by default."""
+        self.session = random.getrandbits(63) if session is None else session # Fits an SQLite INTEGER
+        self.created = time.time()
+        self._events = bytearray()
+        self._last_ns = time.perf_counter_ns()
+
+    def _event(self, kind):
+        delta = (time.perf_counter_ns() - self._last_ns) // 1000
+        self._last_ns += delta * 1000 # Keep the rounding off the next event, so it doesn't add up
+        self._events += _EVENT.pack(kind, min(delta, _MAX_DELTA))
+
+    def shown(self, cell=None):
+        """A question was shown; `cell` is its cell in adaptive games."""
+        self._event(SHOWN)
+        if cell is not None:
+            self._events.append(cell)
+
+    def keystroke(self):
+        self._event(KEY)
+
+    def submitted(self, text):
+        encoded = text.encode("utf-8")[:255]
+        self._event(SUBMIT)
+        self._events.append(len(encoded))
+        self._events += encoded
+
+    def result(self, result):
+        self._event(RESULT)
+        self._events.append(RESULTS.index(result))
+
+    def finish(self, settings, mode, seed, questions, picks=None, adaptive=False):
+        """Ends the game; returns its journal record.
+
+        `questions` is the length of the set (0 for sprint and endless games)
+        and `picks` the positions of the questions played, if any were skipped.
+        """
+        self._event(END)
+        picks = picks or ()
+        flags = ((1 if settings.add_sub else 0) | (2 if settings.mul_div else 0) | (4 if settings.mixed else 0)
+                 | (8 if adaptive else 0))
+        body = b"".join((_HEADER.pack(self.session, self.created, MODES.index(mode), settings.operands,
+                                      settings.digits, flags, seed, questions, len(picks)),
+                         struct.pack(f"<{len(picks)}I", *picks), self._events))
+        return b"".join((_FRAME.pack(MAGIC, len(body)), body, _CRC.pack(zlib.crc32(body))))
+
+
+def append_record(path, record):
+    """Appends a record to a journal file in one write."""
+    with open(path, "ab") as f:
+        f.write(record)
+
+
+def read_records(data):
+    """Yields the body of each record in journal `data`.
+
+    Stops at the first damaged or incomplete record (e.g. a write cut short).
+    """
+    offset = 0
+    end = len(data)
+    while offset + _FRAME.size <= end:
+        magic, length = _FRAME.unpack_from(data, offset)
+        start = offset + _FRAME.size
+        if magic != MAGIC or start + length + _CRC.size > end:
+            return
+        body = data[start:start + length]
+        if _CRC.unpack_from(data, start + length)[0] != zlib.crc32(body):
+            return
+        yield body
+        offset = start + length + _CRC.size
+
+
+def _answers(settings, length, seed, picks):
+    """The answers of the questions a game was played from, in order."""
+    if not length:
+        answers = answer_stream(settings, random.Random(seed))
+    elif picks: # From seen_questions.candidates
+        answers = chain(seeded_batch(settings, length, seed).answers, answer_stream(settings, random.Random(seed)))
+    else:
+        return iter(seeded_batch(settings, length, seed).answers)
+    return _picked(answers, picks) if picks else answers
+
+
+def _picked(source, picks):
+    """The items of `source` at increasing positions `picks`."""
+    position = -1
+    for pick in picks:
+        yield next(islice(source, pick - position - 1, None))
+        position = pick
+
+
+def verify(body):
+    """Replays one record; returns a Verdict with the recomputed score in seconds."""
+    (session, created, mode_code, operands, digits, flags, seed, length,
+     num_picks) = _HEADER.unpack_from(body)
+    settings = GameSettings(operands, digits, bool(flags & 1), bool(flags & 2), bool(flags & 4))
+    mode = MODES[mode_code] if mode_code < len(MODES) else None
+    offset = _HEADER.size
+    picks = struct.unpack_from(f"<{num_picks}I", body, offset)
+    offset += 4 * num_picks
+
+    adaptive = bool(flags & 8)
+
+    def verdict(reason, score=0.0, correct=0):
+        return Verdict(session, reason is None, reason, settings, mode, seed, score, correct, created, adaptive)
+
+    if mode is None:
+        return verdict(f"unknown mode {mode_code}")
+    if adaptive: # Each SHOWN names the question's cell
+        from player_stats import cell_question
+        rng = random.Random(seed)
+    else:
+        answers = _answers(settings, length, seed, picks)
+
+    now = 0 # Microseconds since the game began
+    shown_at = None # When the open question was shown, None when there is none
+    answer = graded = None
+    answered = correct = 0
+    score = 0
+    size = len(body)
+    unpack_event = _EVENT.unpack_from
+    while offset < size:
+        kind, delta = unpack_event(body, offset)
+        offset += _EVENT.size
+        now += delta
+        if kind == SHOWN:
+            if length and answered == length:
+                return verdict("more questions than the set has")
+            if adaptive:
+                cell = body[offset]
+                offset += 1
+                answer = cell_question(settings, cell, rng).answer
+            else:
+                answer = next(answers)
+            shown_at = now
+            graded = None
+        elif kind == KEY:
+            pass
+        elif kind == SUBMIT:
+            text_length = body[offset]
+            text = bytes(body[offset + 1:offset + 1 + text_length]).decode("utf-8", "replace")
+            offset += 1 + text_length
+            if shown_at is None:
+                return verdict("answer submitted with no question open")
+            graded = grade_answer(text, answer)
+        elif kind == RESULT:
+            code = body[offset]
+            offset += 1
+            if graded is None or code >= len(RESULTS) or RESULTS[code] != graded:
+                return verdict(f"question {answered + 1}: recorded result doesn't match the answer")
+            graded = None
+            if code == 0: # Correct
+                score += now - shown_at
+                shown_at = None
+                answered += 1
+                correct += 1
+        elif kind == END:
+            if offset != size:
+                return verdict("events after the end of the game")
+            if shown_at is not None:
+                score += now - shown_at # Time on the question the game ended on, as the game counts it
+            if mode == MODE_CLASSIC and correct != length:
+                return verdict(f"only {correct} of {length} questions answered", score / 1e6, correct)
+            return verdict(None, score / 1e6, correct)
+        else:
+            return verdict(f"unknown event {kind}")
+    return verdict("the game never ended")
+
+
+def load_journal(path):
+    """Maps a journal file; returns (mmap or b"" if empty, file object to close)."""
+    f = open(path, "rb")
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError: # Empty file
+        data = b""
+    return data, f
+
+
+def audit(verdicts, store):
+    """Checks every leaderboard score against the replayed games.
+
+    Yields (id, name, score, settings, problem) for each score that didn't
+    check out; problem is None for scores with no journal (e.g. imported ones).
+    """
+    for score_id, name, score, settings, session in store.audit_rows():
+        if session is None:
+            yield score_id, name, score, settings, None
+            continue
+        verdict = verdicts.get(session)
+        if verdict is None:
+            problem = "its game is not in the journal"
+        elif not verdict.ok:
+            problem = verdict.reason
+        elif verdict.adaptive:
+            problem = "its game was an adaptive one"
+        elif verdict.mode != MODE_CLASSIC or verdict.settings.label() != settings:
+            problem = f"the journal has a {verdict.mode} game of {verdict.settings.label()}"
+        elif abs(verdict.score - score) > SCORE_TOLERANCE:
+            problem = f"the replayed game took {verdict.score:.3f}s"
+        else:
+            continue
+        yield score_id, name, score, settings, problem
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Verify recorded games and leaderboard scores.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("verify", help="replay every game in a journal")
+    check.add_argument("path", nargs="?", default=JOURNAL_FILE)
+    check.add_argument("--db", help="also check every score in this leaderboard database")
+    check.add_argument("--list", action="store_true", help="list each game or score that failed")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        data, f = load_journal(args.path)
+    except OSError as e:
+        parser.error(str(e))
+    verdicts = {}
+    failed = 0
+    with f:
+        for body in read_records(data):
+            try:
+                verdict = verify(body)
+            except (struct.error, IndexError, StopIteration, ValueError) as e:
+                verdict = None
+                reason = f"unreadable record ({e.__class__.__name__})"
+            else:
+                verdicts[verdict.session] = verdict
+                reason = verdict.reason
+            if reason is not None:
+                failed += 1
+                if args.list:
+                    print(f"game {verdict.session if verdict else '?'}: {reason}")
+    elapsed = time.perf_counter() - started
+    checked = len(verdicts)
+    rate = f" ({checked / elapsed:,.0f} per second)" if elapsed > 0 else ""
+    print(f"Replayed {checked} games in {elapsed:.2f}s{rate}: {failed} failed", file=sys.stderr)
+
+    if args.db:
+        from leaderboard_store import LeaderboardStore
+        store = LeaderboardStore(args.db)
+        try:
+            unrecorded = bad = 0
+            for score_id, name, score, settings, problem in audit(verdicts, store):
+                if problem is None:
+                    unrecorded += 1
+                    continue
+                bad += 1
+                if args.list:
+                    print(f"score {score_id} ({name}, {score:.2f}s, {settings}): {problem}")
+        finally:
+            store.close()
+        print(f"Leaderboard: {bad} scores don't match their games, {unrecorded} have no journal",
+              file=sys.stderr)
+        if bad:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Per-question response times for Quick Math Challenge.
+
+For every question the game records, with `time.perf_counter_ns` (monotonic,
+so clock adjustments during a game don't matter):
+    - how long until the first keystroke,
+    - how long until the correct answer,
+    - how many wrong answers came first.
+
+Records go into a preallocated ring buffer of flat arrays, so recording a
+question is a few array stores. A game's score is the sum of its questions'
+answer times, which leaves out the "Correct!" pause between questions.
+
+Finished games are appended to a CSV file, and this module turns any number
+of those files into per-operation latency histograms:
+
+    python telemetry.py math_game_timings.csv --by op,digits
+"""
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+
+from question_engine import OP_NAMES
+
+TIMINGS_FILE = "math_game_timings.csv"
+RING_SIZE = 4096
+# Upper edges of the histogram bins, in milliseconds; the last bin is open
+HISTOGRAM_EDGES_MS = (500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 20000, 30000)
+CSV_FIELDS = ["op", "operands", "digits", "first_key_ms", "answer_ms", "wrong"]
+GROUPINGS = ("op", "digits", "operands")
+_LABEL_SUFFIXES = {"op": "", "operands": "op", "digits": "dig"} # Like GameSettings.label()
+
+_NONE = -1 # Not recorded (no keystroke, or not answered yet)
+
+
+class QuestionTimings:
+    """Ring buffer of per-question timings.
+
+    Call `begin_game`, then for every question `question_shown`, `keystroke`
+    for each key, `wrong_answer` for each wrong answer and `question_answered`
+    when it's right. Only the last `size` questions are kept.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.ops = array("B", bytes(size))
+        self.operands = array("B", bytes(size))
+        self.digits = array("B", bytes(size))
+        self.wrong = array("H", bytes(2 * size))
+        self.shown_ns = array("q", bytes(8 * size))
+        self.first_key_ns = array("q", bytes(8 * size))
+        self.answered_ns = array("q", bytes(8 * size))
+        self.count = 0 # Questions recorded so far, including overwritten ones
+        self.game_start = 0 # `count` when the current game began
+        self._open = False # The latest question hasn't been answered yet
+        self._game_ns = 0 # Answer time of the current game's finished questions
+
+    def begin_game(self):
+        self.game_start = self.count
+        self._open = False
+        self._game_ns = 0
+
+    def question_shown(self, op, settings):
+        self.close_question()
+        slot = self.count % self.size
+        self.ops[slot] = op
+        self.operands[slot] = settings.operands
+        self.digits[slot] = settings.digits
+        self.wrong[slot] = 0
+        self.first_key_ns[slot] = _NONE
+        self.answered_ns[slot] = _NONE
+        self.count += 1
+        self._open = True
+        self.shown_ns[slot] = time.perf_counter_ns() # Last, so the bookkeeping isn't timed
+
+    def keystroke(self):
+        if self._open:
+            slot = (self.count - 1) % self.size
+            if self.first_key_ns[slot] == _NONE:
+                self.first_key_ns[slot] = time.perf_counter_ns() - self.shown_ns[slot]
+
+    def wrong_answer(self):
+        if self._open:
+            slot = (self.count - 1) % self.size
+            self.wrong[slot] = min(self.wrong[slot] + 1, 0xFFFF)
+
+    def question_answered(self):
+        """Stops the clock on the current question; returns its answer time in ns."""
+        now = time.perf_counter_ns()
+        if not self._open:
+            return 0
+        slot = (self.count - 1) % self.size
+        elapsed = now - self.shown_ns[slot]
+        self.answered_ns[slot] = elapsed
+        self._game_ns += elapsed
+        self._open = False
+        return elapsed
+
+    def close_question(self):
+        """Adds an unanswered question's time so far to the game (e.g. the game ended on it)."""
+        if self._open:
+            slot = (self.count - 1) % self.size
+            self._game_ns += time.perf_counter_ns() - self.shown_ns[slot]
+            self._open = False
+
+    def game_seconds(self):
+        """Time spent on the current game's questions, without the pauses between them."""
+        total = self._game_ns
+        if self._open:
+            total += time.perf_counter_ns() - self.shown_ns[(self.count - 1) % self.size]
+        return total / 1e9
+
+    def records(self, since=None):
+        """Yields (op, operands, digits, first_key_ms, answer_ms, wrong) for each kept question.
+
+        `since` is a `count` value, e.g. `game_start`; times not recorded are None.
+        """
+        start = max(self.count - self.size, 0 if since is None else since)
+        for n in range(start, self.count):
+            slot = n % self.size
+            first_key, answered = self.first_key_ns[slot], self.answered_ns[slot]
+            yield (self.ops[slot], self.operands[slot], self.digits[slot],
+                   None if first_key == _NONE else first_key / 1e6,
+                   None if answered == _NONE else answered / 1e6,
+                   self.wrong[slot])
+
+    def save_game(self, path=TIMINGS_FILE):
+        """Appends the current game's questions to a CSV file."""
+        append_records(path, list(self.records(self.game_start)))
+
+
+def append_records(path, records):
+    """Appends `records` (as yielded by QuestionTimings.records) to a timing CSV file.
+
+    The rows go out in a single write to a file opened for appending, so
+    several instances of the game can add games to the same file at once.
+    """
+    import csv, io # Only once a game is over, so they don't slow down the first question
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for op, operands, digits, first_key, answer, wrong in records:
+        writer.writerow([OP_NAMES[op], operands, digits,
+                         "" if first_key is None else f"{first_key:.1f}",
+                         "" if answer is None else f"{answer:.1f}", wrong])
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        if f.tell() == 0: # New file
+            f.write(",".join(CSV_FIELDS) + "\r\n")
+        f.write(out.getvalue())
+
+
+def read_timings(paths):
+    """Yields (op, operands, digits, first_key_ms, answer_ms, wrong) rows from timing CSV files."""
+    import csv
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield (row["op"], int(row["operands"]), int(row["digits"]),
+                       float(row["first_key_ms"]) if row["first_key_ms"] else None,
+                       float(row["answer_ms"]) if row["answer_ms"] else None,
+                       int(row["wrong"]))
+
+
+def latency_histograms(rows, by=("op",), edges=HISTOGRAM_EDGES_MS):
+    """Groups answered questions and summarizes their answer times.
+
+    Returns {group label: {"count", "counts" (per bin), "p50_ms", "p90_ms",
+    "first_key_p50_ms", "wrong_per_question"}}.
+    """
+    fields = {"op": 0, "operands": 1, "digits": 2}
+    groups = defaultdict(lambda: ([], [], [0]))
+    for row in rows:
+        answer = row[4]
+        if answer is None:
+            continue
+        answers, first_keys, wrong = groups[tuple(row[fields[name]] for name in by)]
+        answers.append(answer)
+        if row[3] is not None:
+            first_keys.append(row[3])
+        wrong[0] += row[5]
+
+    def percentile(values, p):
+        return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+    summary = {}
+    for key in sorted(groups, key=str):
+        answers, first_keys, wrong = groups[key]
+        answers.sort()
+        first_keys.sort()
+        counts = [0] * (len(edges) + 1)
+        for answer in answers:
+            counts[bisect_right(edges, answer)] += 1
+        label = " ".join(f"{value}{_LABEL_SUFFIXES[name]}" for name, value in zip(by, key))
+        summary[label] = {"count": len(answers), "counts": counts,
+                          "p50_ms": percentile(answers, 0.5), "p90_ms": percentile(answers, 0.9),
+                          "first_key_p50_ms": percentile(first_keys, 0.5),
+                          "wrong_per_question": wrong[0] / len(answers)}
+    return summary
+
+
+def print_histograms(summary, edges=HISTOGRAM_EDGES_MS, out=sys.stdout):
+    labels = [f"<{edge / 1000:g}s" for edge in edges] + [f">={edges[-1] / 1000:g}s"]
+    print(f"{'group':<16}{'n':>7}{'p50':>8}{'p90':>8}{'key':>7}{'wrong':>7}  " + " ".join(f"{l:>6}" for l in labels),
+          file=out)
+    for label, group in summary.items():
+        first_key = group["first_key_p50_ms"]
+        print(f"{label:<16}{group['count']:>7}{group['p50_ms'] / 1000:>7.2f}s{group['p90_ms'] / 1000:>7.2f}s"
+              f"{'' if first_key is None else f'{first_key / 1000:.2f}s':>7}{group['wrong_per_question']:>7.2f}  "
+              + " ".join(f"{count:>6}" for count in group["counts"]), file=out)
+
+
+def main(argv=None):
+    import argparse, json
+    parser = argparse.ArgumentParser(description="Per-operation answer time histograms.")
+    parser.add_argument("paths", nargs="*", default=[TIMINGS_FILE], help="timing CSV files")
+    parser.add_argument("--by", default="op", help=f"comma-separated grouping: {', '.join(GROUPINGS)}")
+    parser.add_argument("--json", action="store_true", help="print the histograms as JSON")
+    args = parser.parse_args(argv)
+
+    by = tuple(name.strip() for name in args.by.split(",") if name.strip())
+    if not by or set(by) - set(GROUPINGS):
+        parser.error(f"--by takes a comma-separated list of {', '.join(GROUPINGS)}")
+    try:
+        summary = latency_histograms(read_timings(args.paths), by)
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(str(e))
+    if args.json:
+        json.dump({"edges_ms": HISTOGRAM_EDGES_MS, "groups": summary}, sys.stdout, indent=1, ensure_ascii=False)
+        print()
+    else:
+        print_histograms(summary)
+
+
+if __name__ == "__main__":
+    main()
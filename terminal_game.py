@@ -0,0 +1,289 @@
+"""Terminal version of Quick Math Challenge.
+
+For SSH sessions and machines without a display. It plays the same games as
+the window (classic, sprint and endless, with numbered question sets), checks
+answers the same way and shares the leaderboard, but never imports Tk. The
+leaderboard is only opened once the game is over, so the first question is
+on screen as soon as Python has started. For the same reason a plain game
+doesn't import argparse (and the re module it loads) and the modules for
+--name and --trace are only imported when those options are given.
+
+Usage:
+    python math_game.py --cli
+    python math_game.py --cli --mode sprint --operands 3 --digits 2 --ops +-×÷ --mixed --set 42
+    python math_game.py --cli --name Ana --adaptive --operands 3 --digits 3
+"""
+import itertools
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from question_engine import (NUM_QUESTIONS, MIN_OPERANDS, MAX_OPERANDS, MIN_DIGITS, MAX_DIGITS,
+                             ANSWER_CORRECT, ANSWER_EMPTY, ANSWER_INVALID, SPRINT_SECONDS,
+                             MODE_CLASSIC, MODE_SPRINT, MODE_ENDLESS, grade_answer, new_seed,
+                             question_stream, seeded_batch, settings_from_ops)
+from telemetry import QuestionTimings, TIMINGS_FILE
+from session_journal import SessionJournal, JOURNAL_FILE, MAX_SEED, append_record
+
+LEADERBOARD_ROWS = 10
+DEFAULT_OPTIONS = {"mode": MODE_CLASSIC, "operands": 2, "digits": 2, "ops": "+-", "mixed": False,
+                   "set_number": None, "name": None, "adaptive": False, "trace": None, "profile": None}
+
+
+def _read(prompt):
+    """input() that returns None when the player quits (Ctrl-D, Ctrl-C or 'q')."""
+    try:
+        text = input(prompt)
+    except (EOFError, KeyboardInterrupt):
+        print()
+        return None
+    return None if text.strip().lower() in ("q", "quit") else text
+
+
+def play(settings, mode=MODE_CLASSIC, set_number=None, seen=None, journal=None, stats=None, adaptive=False):
+    """Plays one game; returns (questions answered correctly, seconds, set number, finished).
+
+    With `seen` (a SeenQuestions), questions the player has already seen are
+    skipped, unless a set number was given. The set number is None if any
+    were, since it wouldn't replay the game. The game is recorded in
+    `journal` (a SessionJournal) and appended to JOURNAL_FILE. Every answer
+    is added to `stats` (a PlayerStats), and with `adaptive` the questions
+    are picked from the player's slowest cells (unless a set number was given).
+    """
+    journal = journal or SessionJournal()
+    seed = new_seed() if set_number is None else set_number
+    if set_number is not None:
+        seen = None
+    adaptive = adaptive and stats is not None and set_number is None
+    if stats is not None:
+        from player_stats import AdaptiveQuestions, cell_of
+    if adaptive: # Repeats are allowed; the questions depend on the stats anyway
+        seen = None
+        picker = AdaptiveQuestions(stats, settings, seed)
+        questions = itertools.islice(picker, NUM_QUESTIONS) if mode == MODE_CLASSIC else picker
+    elif mode == MODE_CLASSIC:
+        batch = seeded_batch(settings, NUM_QUESTIONS, seed)
+        questions = iter(batch if seen is None else seen.fresh_batch(batch))
+    else:
+        questions = question_stream(settings, random.Random(seed))
+        if seen is not None:
+            questions = seen.fresh(questions)
+    timings = QuestionTimings()
+    timings.begin_game()
+    journal.begin()
+    started = time.perf_counter()
+    correct = 0
+    finished = True
+
+    for number, question in enumerate(questions, 1):
+        if mode == MODE_SPRINT:
+            time_left = SPRINT_SECONDS - (time.perf_counter() - started)
+            if time_left <= 0:
+                break
+            print(f"\nQuestion {number} - {time_left:.0f}s left")
+        elif mode == MODE_ENDLESS:
+            print(f"\nQuestion {number} - one mistake ends the game")
+        else:
+            print(f"\nQuestion {number} of {NUM_QUESTIONS}")
+        if adaptive:
+            cell, question_settings = picker.cell, picker.settings
+        else:
+            cell = cell_of(question.op, settings) if stats is not None else None
+            question_settings = settings
+        timings.question_shown(question.op, question_settings)
+        journal.shown(cell if adaptive else None)
+        while True:
+            text = _read(f"  {question.text.replace('?', '')}")
+            if text is None:
+                finished = False
+                break
+            journal.submitted(text)
+            result = grade_answer(text, question.answer)
+            journal.result(result)
+            if result == ANSWER_EMPTY:
+                print("  Please enter an answer.")
+            elif result == ANSWER_INVALID:
+                print("  Please enter a valid number.")
+            elif result == ANSWER_CORRECT:
+                elapsed = timings.question_answered()
+                if stats is not None:
+                    stats.correct(cell, elapsed / 1e9)
+                correct += 1
+                print("  Correct!")
+                break
+            elif mode == MODE_ENDLESS:
+                timings.wrong_answer()
+                if stats is not None:
+                    stats.wrong(cell)
+                print(f"  Game over! The answer was {question.answer}")
+                finished = False
+                break
+            else:
+                timings.wrong_answer()
+                if stats is not None:
+                    stats.wrong(cell)
+                print("  Incorrect. Please try again")
+        if not finished:
+            break
+    if mode == MODE_ENDLESS:
+        finished = True # An endless game always ends on a mistake (or quitting)
+
+    timings.close_question()
+    try:
+        timings.save_game(TIMINGS_FILE)
+    except OSError as e:
+        print(f"Warning: Could not save question timings {TIMINGS_FILE}: {e}")
+    picks = seen.picks if seen is not None and seen.skipped else None
+    try:
+        append_record(JOURNAL_FILE, journal.finish(settings, mode, seed,
+                                                   NUM_QUESTIONS if mode == MODE_CLASSIC else 0, picks, adaptive))
+    except OSError as e:
+        print(f"Warning: Could not save the game to {JOURNAL_FILE}: {e}")
+    if adaptive:
+        seed = None # The set number alone doesn't replay an adaptive game
+    if stats is not None:
+        try:
+            stats.save()
+        except OSError as e:
+            print(f"Warning: Could not save your answer statistics {stats.path}: {e}")
+    if seen is not None:
+        if seen.exhausted:
+            print("\nFew new questions are left for these settings, so some were repeats.")
+        if seen.skipped:
+            seed = None
+        try:
+            seen.save()
+        except OSError as e:
+            print(f"Warning: Could not save the questions you have seen {seen.path}: {e}")
+    return correct, timings.game_seconds(), seed, finished
+
+
+def show_leaderboard(store, settings_str, out=sys.stdout):
+    entries = store.top(settings_str, LEADERBOARD_ROWS)
+    if not entries:
+        print("Leaderboard is empty.", file=out)
+        return
+    print(f"--- Top {len(entries)}: {settings_str} ---", file=out)
+    print("{:<4} {:<13} {:<9}".format("Rank", "Name", "Time(s)"), file=out)
+    for rank, entry in enumerate(entries, 1):
+        print(f"{rank:<4} {entry['name'][:12]:<13} {entry['score']:<9.2f}", file=out)
+
+
+def record_score(score, settings_str, name=None, session=None):
+    """Adds a classic game to the leaderboard and shows where it ranks."""
+    import sqlite3
+    from leaderboard_store import LeaderboardStore, LEADERBOARD_DB, LEADERBOARD_JSON
+
+    if name is None:
+        name = _read("Enter your name: ") or ""
+    name = name.strip()[:12] or "Anonymous"
+    try:
+        store = LeaderboardStore(LEADERBOARD_DB, json_path=LEADERBOARD_JSON)
+        try:
+            store.add_score(name, score, settings_str, session)
+            rank, total, percentile = store.standing(score, settings_str)
+            print(f"Rank {rank} of {total} for {settings_str} (faster than {percentile:.0f}% of games)\n")
+            show_leaderboard(store, settings_str)
+        finally:
+            store.close()
+    except sqlite3.Error as e:
+        print(f"Error saving leaderboard: {e}")
+
+
+def _trace_game():
+    """Times the game's phases with tracing spans (does nothing unless --trace was given)."""
+    import tracing
+    if not tracing.enabled():
+        return
+    # Otherwise only imported once the game is over, or with --name
+    from leaderboard_store import LeaderboardStore
+    from seen_questions import SeenQuestions
+    from player_stats import PlayerStats
+    tracing.instrument(sys.modules[__name__], "seeded_batch", "append_record", "record_score",
+                       "show_leaderboard", prefix="terminal_game")
+    tracing.instrument(QuestionTimings, "save_game")
+    tracing.instrument(LeaderboardStore, "add_score", "top", "standing", category="leaderboard")
+    tracing.instrument(SeenQuestions, "for_player", "fresh_batch", "save")
+    tracing.instrument(PlayerStats, "for_player", "save")
+
+
+def parse_options(argv):
+    """Parses the command line; returns (options, settings)."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Play Quick Math Challenge in the terminal.")
+    parser.set_defaults(**DEFAULT_OPTIONS)
+    parser.add_argument("--mode", choices=(MODE_CLASSIC, MODE_SPRINT, MODE_ENDLESS))
+    parser.add_argument("--operands", type=int, choices=range(MIN_OPERANDS, MAX_OPERANDS + 1))
+    parser.add_argument("--digits", type=int, choices=range(MIN_DIGITS, MAX_DIGITS + 1),
+                        metavar=f"{{{MIN_DIGITS}..{MAX_DIGITS}}}")
+    parser.add_argument("--ops", help="'+-', '×÷' (or '*/') or both")
+    parser.add_argument("--mixed", action="store_true", help="mix the operators within each question")
+    parser.add_argument("--set", type=int, dest="set_number", help="question set number, to replay a set")
+    parser.add_argument("--name", help="name for the leaderboard (asked after the game otherwise); "
+                                       "also skips questions this player has already seen and "
+                                       "keeps their answer statistics")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="practice: more questions of the kinds you are slowest at, up to the "
+                             "chosen operands and digits (needs --name; not on the leaderboard)")
+    parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the game's phases to FILE")
+    parser.add_argument("--profile", metavar="FILE", help="profile the game with cProfile into FILE")
+    args = parser.parse_args(argv)
+
+    settings = settings_from_ops(args.operands, args.digits, args.ops, args.mixed)
+    if not (settings.add_sub or settings.mul_div):
+        parser.error("--ops needs at least one of + - × ÷")
+    if args.set_number is not None and not 0 <= args.set_number <= MAX_SEED:
+        parser.error(f"Set numbers go from 0 to {MAX_SEED}")
+    if args.adaptive and not args.name:
+        parser.error("--adaptive needs --name, whose answer statistics it uses")
+    if args.adaptive and args.set_number is not None:
+        parser.error("--adaptive games can't be played from a set number")
+    return args, settings
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        args, settings = parse_options(argv)
+    else: # Saves importing argparse, the slowest part of starting a plain game
+        args = SimpleNamespace(**DEFAULT_OPTIONS)
+        settings = settings_from_ops(args.operands, args.digits, args.ops, args.mixed)
+    if args.trace or args.profile:
+        import tracing
+        tracing.start(args.trace, args.profile)
+        _trace_game()
+    print(f"Quick Math Challenge! ({settings.label()}) - type q to quit")
+
+    seen = None
+    if args.name:
+        from seen_questions import SeenQuestions
+        from player_stats import PlayerStats
+        try:
+            seen = SeenQuestions.for_player(args.name)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read the questions you have seen: {e}")
+            seen = SeenQuestions(SeenQuestions.for_player_path(args.name))
+    stats = None
+    if args.name:
+        try:
+            stats = PlayerStats.for_player(args.name)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read your answer statistics: {e}")
+            stats = PlayerStats(PlayerStats.for_player_path(args.name))
+    journal = SessionJournal()
+    correct, seconds, seed, finished = play(settings, args.mode, args.set_number, seen, journal, stats,
+                                            args.adaptive)
+    set_text = f" (set #{seed})" if seed is not None else ""
+    print("\nFinished!")
+    if args.mode == MODE_CLASSIC:
+        print(f"Your time: {seconds:.2f} seconds{set_text}")
+        if finished and not args.adaptive: # Adaptive games aren't of the settings the board ranks
+            record_score(seconds, settings.label(), args.name, journal.session)
+    else:
+        per_minute = correct * 60 / seconds if seconds > 0 else 0
+        print(f"{correct} correct - {per_minute:.1f} per minute{set_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Tests for the division questions of question_engine.
+
+    python -m pytest test_question_engine.py
+"""
+import itertools
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from question_engine import (DIV, MIN_OPERANDS, MAX_OPERANDS, MAX_STANDARD_DIGITS, GameSettings,
+                             division_chains, generate_op_batch)
+
+SAMPLES_PER_CHAIN = 200
+
+
+def _settings(operands, digits):
+    return GameSettings(operands, digits, False, True)
+
+
+def _is_valid_chain(chain, low, high):
+    """A dividend in [2*low, high] and divisors in [max(2, low), high] that each divide exactly."""
+    dividend, *divisors = chain
+    if not 2 * low <= dividend <= high:
+        return False
+    for divisor in divisors:
+        if not max(2, low) <= divisor <= high or dividend % divisor:
+            return False
+        dividend //= divisor
+    return True
+
+
+def _brute_force_chains(width, low, high):
+    values = range(low, high + 1)
+    return {chain for chain in itertools.product(values, repeat=width) if _is_valid_chain(chain, low, high)}
+
+
+@pytest.mark.parametrize("width, digits", [(2, 1), (3, 1), (4, 1), (2, 2), (3, 2)])
+def test_division_chains_are_every_valid_chain(width, digits):
+    low, high = _settings(width, digits).digit_range()
+    chains = list(zip(*division_chains(width, low, high)))
+    assert len(chains) == len(set(chains))
+    assert set(chains) == _brute_force_chains(width, low, high)
+
+
+@pytest.mark.parametrize("width", [2, 3])
+def test_division_draws_are_uniform_over_valid_chains(width):
+    settings = _settings(width, 1)
+    chains = set(zip(*division_chains(width, *settings.digit_range())))
+    batch = generate_op_batch(settings, DIV, SAMPLES_PER_CHAIN * len(chains), random.Random(2024))
+    counts = Counter(zip(*batch.columns))
+    assert set(counts) <= chains
+    # Chi-square against equal counts, allowed up to 5 standard deviations above its mean
+    expected = len(batch) / len(chains)
+    chi_square = sum((counts[chain] - expected) ** 2 / expected for chain in chains)
+    degrees = len(chains) - 1
+    assert chi_square < degrees + 5 * math.sqrt(2 * degrees)
+
+
+@pytest.mark.parametrize("operands", range(MIN_OPERANDS, MAX_OPERANDS + 1))
+@pytest.mark.parametrize("digits", range(1, MAX_STANDARD_DIGITS + 2))
+def test_divisions_are_exact(operands, digits):
+    settings = _settings(operands, digits)
+    low, high = settings.digit_range()
+    indexed = high < 10**MAX_STANDARD_DIGITS and len(division_chains(operands, low, high)[0])
+    batch = generate_op_batch(settings, DIV, 500, random.Random(operands * 10 + digits))
+    for question in batch:
+        dividend, *divisors = question.operands
+        assert dividend == question.answer * math.prod(divisors)
+        assert all(max(2, low) <= divisor <= high for divisor in divisors)
+        if indexed:
+            assert _is_valid_chain(question.operands, low, high)
+        else:
+            # No chain fits the digit range (or it is too big to index): the dividend is
+            # quotient * divisors with the quotient in the range, so it may have more digits
+            assert low <= question.answer <= high
@@ -0,0 +1,152 @@
+"""Optional tracing and profiling of the game's phases.
+
+Tracing is off unless the game is started with --trace or --profile:
+
+    python math_game.py --trace trace.json
+    python math_game.py --profile game.prof
+    python math_game.py --cli --trace trace.json
+
+--trace records a span for every call of the functions passed to
+`instrument` (question generation, leaderboard reads and writes, enabling
+and disabling the options, showing questions...), on every thread, and
+writes them as Chrome trace JSON when the game exits. Open the file in
+chrome://tracing or https://ui.perfetto.dev. Main thread stalls caught by
+ui_tasks.StallMonitor are added as "stall" spans, so each one lines up with
+the phase that caused it.
+
+--profile runs cProfile on the main thread, saves its stats to the file
+(for pstats or snakeviz) and prints the slowest functions.
+
+When tracing is off, `instrument` leaves the functions untouched, so the
+game runs exactly the code it would without this module.
+"""
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+MAX_EVENTS = 1_000_000 # Only the latest spans are kept in long sessions
+PROFILE_ROWS = 25
+
+_tracer = None # The active Tracer, if --trace was given
+_profiler = None # (cProfile.Profile, path), if --profile was given
+
+
+class Tracer:
+    """Collects spans in memory until `write`."""
+
+    def __init__(self, path, max_events=MAX_EVENTS):
+        self.path = path
+        self.events = deque(maxlen=max_events) # (name, category, start_ns, duration_ns, thread id, args)
+        self.threads = {} # Thread id: thread name
+        self.origin_ns = time.perf_counter_ns()
+
+    def add(self, name, category, start_ns, duration_ns, args=None):
+        thread = threading.get_ident()
+        if thread not in self.threads:
+            self.threads[thread] = threading.current_thread().name
+        self.events.append((name, category, start_ns, duration_ns, thread, args))
+
+    def chrome_trace(self):
+        """The spans as a Chrome trace ("X" events with microsecond times)."""
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}}
+                  for thread, name in self.threads.items()]
+        origin = self.origin_ns
+        for name, category, start_ns, duration_ns, thread, args in self.events:
+            event = {"name": name, "cat": category, "ph": "X", "pid": pid, "tid": thread,
+                     "ts": (start_ns - origin) / 1000, "dur": duration_ns / 1000}
+            if args:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self):
+        import json
+        from atomic_file import atomic_open
+        with atomic_open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def enabled():
+    """True if --trace is on."""
+    return _tracer is not None
+
+
+def add_span(name, start_ns, duration_ns, category="game", **args):
+    """Records a span measured elsewhere (perf_counter_ns times), if tracing."""
+    if _tracer is not None:
+        _tracer.add(name, category, start_ns, duration_ns, args or None)
+
+
+def _traced(fn, name, category):
+    @functools.wraps(fn)
+    def traced(*args, **kwargs):
+        start_ns = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            tracer = _tracer
+            if tracer is not None:
+                tracer.add(name, category, start_ns, time.perf_counter_ns() - start_ns)
+    traced.__wrapped_by_tracing__ = True
+    return traced
+
+
+def instrument(owner, *names, category="game", prefix=None):
+    """Wraps functions `names` of a class or module in spans, if --trace is on.
+
+    Spans are named 'prefix.name', the prefix being the class or module name
+    by default. Without a tracer nothing is changed.
+    """
+    if _tracer is None:
+        return
+    prefix = prefix or owner.__name__
+    for name in names:
+        fn = getattr(owner, name)
+        if getattr(fn, "__wrapped_by_tracing__", False):
+            continue
+        traced = _traced(fn, f"{prefix}.{name}", category)
+        if isinstance(owner, type) and isinstance(owner.__dict__.get(name), staticmethod):
+            traced = staticmethod(traced)
+        setattr(owner, name, traced)
+
+
+def start(trace_path=None, profile_path=None):
+    """Turns on tracing and/or profiling; the results are written by `stop` (also at exit)."""
+    global _tracer, _profiler
+    if trace_path:
+        _tracer = Tracer(trace_path)
+    if profile_path:
+        import cProfile # Only when profiling: cProfile and pstats take longer to import than the game
+        profile = cProfile.Profile()
+        _profiler = (profile, profile_path)
+        profile.enable()
+    if trace_path or profile_path:
+        atexit.register(stop)
+
+
+def stop():
+    """Writes the trace and profile, and turns both off."""
+    global _tracer, _profiler
+    tracer, profiler = _tracer, _profiler
+    _tracer = _profiler = None
+    if profiler is not None:
+        import pstats
+        profile, path = profiler
+        profile.disable()
+        try:
+            profile.dump_stats(path)
+        except OSError as e:
+            print(f"Warning: Could not save the profile {path}: {e}", file=sys.stderr)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_ROWS)
+    if tracer is not None:
+        try:
+            tracer.write()
+        except OSError as e:
+            print(f"Warning: Could not save the trace {tracer.path}: {e}", file=sys.stderr)
+        else:
+            print(f"Trace of {len(tracer.events)} spans saved to {tracer.path}", file=sys.stderr)
@@ -0,0 +1,114 @@
+"""Keeps slow work off the Tk main thread.
+
+`BackgroundTasks` runs functions in a worker thread. Finished calls are put
+on a queue that is polled with `master.after`, so their callbacks run on the
+Tk thread and the Tk thread itself never waits for a disk write or for
+question generation.
+
+`StallMonitor` logs whenever the main thread was busy for longer than one
+frame (16 ms), to catch anything that still blocks it. With --trace, each
+stall is also added to the trace.
+"""
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+POLL_MS = 15 # How often finished tasks are checked for while any are running
+STALL_MS = 16 # One frame at 60 Hz
+HEARTBEAT_MS = 50
+
+log = logging.getLogger("math_game")
+
+
+class BackgroundTasks:
+    """Runs functions off the Tk thread and calls back on it with the result.
+
+    One worker by default, so tasks (e.g. saves) finish in the order they were
+    submitted.
+    """
+
+    def __init__(self, master, workers=1, poll_ms=POLL_MS):
+        self.master = master
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="BackgroundTasks")
+        self._results = queue.Queue()
+        self._pending = 0
+        self._poll_id = None
+
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        """Runs fn(*args) in the background.
+
+        on_done(result) or on_error(exception) is then called on the Tk
+        thread; errors without an on_error are logged.
+        """
+        self._pending += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda done: self._results.put((done, on_done, on_error)))
+        if self._poll_id is None:
+            self._poll_id = self.master.after(self.poll_ms, self._poll)
+        return future
+
+    @property
+    def pending(self):
+        """Number of tasks whose callbacks haven't run yet."""
+        return self._pending
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                future, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            error = future.exception()
+            if error is None:
+                if on_done is not None:
+                    on_done(future.result())
+            elif on_error is not None:
+                on_error(error)
+            else:
+                log.error("Background task failed", exc_info=error)
+        if self._pending: # Only poll while something is running
+            self._poll_id = self.master.after(self.poll_ms, self._poll)
+
+    def close(self, wait=True):
+        if self._poll_id is not None:
+            self.master.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._executor.shutdown(wait=wait)
+
+
+class StallMonitor:
+    """Logs main thread stalls, measured as how late a repeating timer fires.
+
+    A timer can only be late by as much as the main thread was busy, so each
+    logged stall is a lower bound on how long the thread was blocked.
+    """
+
+    def __init__(self, master, threshold_ms=STALL_MS, interval_ms=HEARTBEAT_MS):
+        self.master = master
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.stalls = 0
+        self.worst_ms = 0.0
+        self._expected = time.perf_counter() + interval_ms / 1000
+        self._after_id = master.after(interval_ms, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        late_ms = (now - self._expected) * 1000
+        if late_ms > self.threshold_ms:
+            self.stalls += 1
+            self.worst_ms = max(self.worst_ms, late_ms)
+            log.warning("Main thread stalled for at least %.0f ms", late_ms)
+            tracing.add_span("stall", int(self._expected * 1e9), int(late_ms * 1e6), category="stall",
+                             late_ms=round(late_ms, 1))
+        self._expected = now + self.interval_ms / 1000
+        self._after_id = self.master.after(self.interval_ms, self._beat)
+
+    def stop(self):
+        self.master.after_cancel(self._after_id)